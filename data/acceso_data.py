@@ -1,33 +1,136 @@
+import hashlib
+import os
+import tempfile
 import pandas as pd
-from src.utils.helpers import normalizar_cvegeo
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 
+# =======================================================
+# CACHÉ COLUMNAR DE TABLAS LIMPIAS
+# =======================================================
+# Cada tabla se lee de su fuente sólo con las columnas necesarias, se limpia
+# (CVEGEO normalizado con operaciones vectorizadas, valores float32) y se
+# guarda en data/.cache como parquet. El archivo de caché depende de la ruta
+# absoluta de la fuente y de las columnas pedidas; se invalida cuando cambia
+# la firma de la fuente (mtime+tamaño, o hash).
+
+CACHE_DIR = "data/.cache"
+VALIDACION = "mtime"   # 'mtime' o 'hash'
+
+COLS_TOPOFORMA = ["CVEGEO", "CLAVE"]
+COLS_EDAFOLOGIA = ["CVEGEO", "CLAVE_WRB", "GRUPO1", "GRUPO2", "GRUPO3", "CLASE_TEXT", "FRUDICA"]
+COLS_UNIDADES = ["CVEGEO", "TIPO_N"]
+COLS_RANGOS = ["CVEGEO", "RANGOS"]
+
+
+def normalizar_cvegeo_serie(serie):
+    """Versión vectorizada de normalizar_cvegeo para una columna completa."""
+    return serie.astype(str).str.zfill(5)
+
+
+def firma_fuente(path, validacion=VALIDACION):
+    """Firma de un archivo fuente: mtime y tamaño, o sha1 del contenido."""
+    if validacion == "hash":
+        h = hashlib.sha1()
+        with open(path, "rb") as f:
+            for bloque in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloque)
+        return f"sha1:{h.hexdigest()}"
+    st = os.stat(path)
+    return f"mtime:{st.st_mtime_ns}:{st.st_size}"
+
+
+def clave_cache(path, columnas=None):
+    """Hash corto de la ruta absoluta de la fuente y de las columnas pedidas."""
+    texto = os.path.abspath(path) + "|" + ",".join(sorted(columnas) if columnas else ["*"])
+    return hashlib.sha1(texto.encode()).hexdigest()[:12]
+
+
+def tipar(df):
+    """Columnas float64 a float32 (CVEGEO se queda como texto)."""
+    flotantes = df.select_dtypes(include="float64").columns
+    df[flotantes] = df[flotantes].astype("float32")
+    return df
+
+
+def leer_fuente(path, columnas=None):
+    """Lee CSV o parquet sólo con `columnas` y normaliza CVEGEO."""
+    if path.endswith(".csv"):
+        df = pd.read_csv(path, usecols=columnas, dtype={"CVEGEO": str})
+    else:
+        df = pd.read_parquet(path, columns=columnas)
+    df["CVEGEO"] = normalizar_cvegeo_serie(df["CVEGEO"])
+    return tipar(df)
+
+
+def cargar_tabla(path, columnas=None, cache_dir=CACHE_DIR, validacion=VALIDACION):
+    """
+    Devuelve la tabla limpia de `path`, usando la caché parquet si su firma
+    coincide con la de la fuente; si no, la reconstruye y la guarda.
+
+    La caché se escribe en un temporal de `cache_dir` y se mueve con
+    os.replace, así nunca queda un archivo a medias (caída o dos workers
+    cargando la misma tabla). Un archivo de caché ilegible cuenta como fallo
+    de caché y se reconstruye.
+    """
+    firma = firma_fuente(path, validacion)
+    nombre = os.path.splitext(os.path.basename(path))[0]
+    ruta_cache = os.path.join(cache_dir, f"{nombre}-{clave_cache(path, columnas)}.parquet")
+
+    df = leer_cache(ruta_cache, firma)
+    if df is not None:
+        return df
+
+    df = leer_fuente(path, columnas)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    tabla = tabla.replace_schema_metadata({**(tabla.schema.metadata or {}), b"firma": firma.encode()})
+    fd, temporal = tempfile.mkstemp(dir=cache_dir, prefix=f".{nombre}-", suffix=".parquet.tmp")
+    os.close(fd)
+    try:
+        pq.write_table(tabla, temporal)
+        os.replace(temporal, ruta_cache)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    return df
+
+
+def leer_cache(ruta_cache, firma):
+    """Tabla de la caché si existe, es legible y su firma coincide; si no, None."""
+    if not os.path.exists(ruta_cache):
+        return None
+    try:
+        metadata = pq.read_schema(ruta_cache).metadata or {}
+        if metadata.get(b"firma") != firma.encode():
+            return None
+        return pd.read_parquet(ruta_cache)
+    except (OSError, pa.ArrowException):
+        return None
+
+
+# =======================================================
+# ACCESO A DATOS
+# =======================================================
 
 def cargar_categoricos():
-    topo = pd.read_csv('data/categoricos/mun_sist_topoformas.csv')
-    topo["CVEGEO"] = topo["CVEGEO"].apply(normalizar_cvegeo)
-    eda = pd.read_csv('data/categoricos/mun_edafologia.csv')
-    eda["CVEGEO"] = eda["CVEGEO"].apply(normalizar_cvegeo)
+    topo = cargar_tabla('data/categoricos/mun_sist_topoformas.csv', COLS_TOPOFORMA)
+    eda = cargar_tabla('data/categoricos/mun_edafologia.csv', COLS_EDAFOLOGIA)
     return eda, topo
 
 def cargar_numericos():
-    unidades_clima = pd.read_csv('data/numericos/mun_unidades_climaticas_final.csv')
-    unidades_clima["CVEGEO"] = unidades_clima["CVEGEO"].apply(normalizar_cvegeo)
-    temperatura_anual = pd.read_csv('data/numericos/mun_temp_media_anual.csv')
-    temperatura_anual["CVEGEO"] = temperatura_anual["CVEGEO"].apply(normalizar_cvegeo)
-    precipitacion_anual = pd.read_csv('data/numericos/mun_precip_media_anual.csv')
-    precipitacion_anual["CVEGEO"] = precipitacion_anual["CVEGEO"].apply(normalizar_cvegeo)
+    unidades_clima = cargar_tabla('data/numericos/mun_unidades_climaticas_final.csv', COLS_UNIDADES)
+    temperatura_anual = cargar_tabla('data/numericos/mun_temp_media_anual.csv', COLS_RANGOS)
+    precipitacion_anual = cargar_tabla('data/numericos/mun_precip_media_anual.csv', COLS_RANGOS)
     return precipitacion_anual, temperatura_anual, unidades_clima
 
 def cargar_mensuales():
-    radiacion = pd.read_parquet('data/series_tiempo/Radiacion_municipal.parquet')
-    radiacion["CVEGEO"] = radiacion["CVEGEO"].apply(normalizar_cvegeo)
-    sequia = pd.read_parquet('data/series_tiempo/Sequia_mensual_completa.parquet')
-    sequia["CVEGEO"] = sequia["CVEGEO"].apply(normalizar_cvegeo)
+    radiacion = cargar_tabla('data/series_tiempo/Radiacion_municipal.parquet')
+    sequia = cargar_tabla('data/series_tiempo/Sequia_mensual_completa.parquet')
     return radiacion, sequia
 
 def cargar_municipios():
-    municipios = pd.read_parquet('data/tabla_municipios.parquet')
-    municipios["CVEGEO"] = municipios["CVEGEO"].apply(normalizar_cvegeo)
+    municipios = cargar_tabla('data/tabla_municipios.parquet')
     return municipios
-
@@ -1,4 +1,5 @@
 import Levenshtein
+from functools import lru_cache
 import pandas as pd
 import numpy as np
 from data.acceso_data import cargar_categoricos, cargar_municipios
@@ -66,11 +67,30 @@ def unir_edafologia(fila):
 
 
 # =======================================================
-# CARGA DE DATOS
+# CARGA DE DATOS (PEREZOSA Y CACHEADA)
 # =======================================================
-    
-edafologia, topoforma = cargar_categoricos()
-municipios = cargar_municipios()
+
+@lru_cache(maxsize=None)
+def datos_categoricos():
+    """(edafologia, topoforma); se leen de disco la primera vez que se piden."""
+    return cargar_categoricos()
+
+
+@lru_cache(maxsize=None)
+def datos_municipios():
+    """Tabla de municipios; se lee de disco la primera vez que se pide."""
+    return cargar_municipios()
+
+
+def __getattr__(nombre):
+    # compatibilidad: `edafologia`, `topoforma` y `municipios` como atributos del módulo
+    if nombre == "edafologia":
+        return datos_categoricos()[0]
+    if nombre == "topoforma":
+        return datos_categoricos()[1]
+    if nombre == "municipios":
+        return datos_municipios()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
 
 # =======================================================
 # MODELO GENERAL
@@ -82,6 +102,73 @@ def modelo_gral(val1_eda, val2_eda, val1_topo, val2_topo):
     return (sim_eda + sim_topo) / 2
 
 
+# =======================================================
+# ÍNDICE EN MEMORIA POR CVEGEO
+# =======================================================
+
+class IndiceCategorico:
+    """
+    Índice en memoria por CVEGEO de los textos ya preprocesados
+    (edafología unida y clave de topoforma limpia).
+
+    - comparar(m1, m2): O(1), mismo valor que comparar_municipios
+    - uno_contra_todos(m): Serie con la similitud de m contra todos
+      (se compara sólo contra los textos únicos)
+    - comparar_lote(pares): array con la similitud de cada par (NaN si falta)
+    """
+
+    def __init__(self, edafologia, topoforma):
+        # como el filtrado original, se usa la primera fila de cada CVEGEO
+        eda = edafologia.drop_duplicates("CVEGEO")
+        topo = topoforma.drop_duplicates("CVEGEO")
+        self.eda = {cve: unir_edafologia(fila) for cve, fila in eda.set_index("CVEGEO").iterrows()}
+        self.topo = {cve: limpiar_texto(v) for cve, v in zip(topo["CVEGEO"], topo["CLAVE"])}
+
+        self.cvegeo = [c for c in self.eda if c in self.topo]
+        self.posicion = {c: i for i, c in enumerate(self.cvegeo)}
+
+        self.eda_unicos, self.eda_cod = np.unique(
+            np.array([self.eda[c] for c in self.cvegeo], dtype=str), return_inverse=True)
+        self.topo_unicos, self.topo_cod = np.unique(
+            np.array([self.topo[c] for c in self.cvegeo], dtype=str), return_inverse=True)
+
+    def textos(self, mun1, mun2):
+        """(v1_eda, v2_eda, v1_topo, v2_topo) o None si falta algún dato."""
+        if mun1 not in self.posicion or mun2 not in self.posicion:
+            return None
+        return self.eda[mun1], self.eda[mun2], self.topo[mun1], self.topo[mun2]
+
+    def comparar(self, mun1, mun2):
+        valores = self.textos(normalizar_cvegeo(mun1), normalizar_cvegeo(mun2))
+        if valores is None:
+            return None
+        return modelo_gral(*valores)
+
+    def uno_contra_todos(self, mun):
+        mun = normalizar_cvegeo(mun)
+        if mun not in self.posicion:
+            return None
+        v_eda, v_topo = self.eda[mun], self.topo[mun]
+        sim_eda = np.array([comparar_edafologia(v_eda, u) for u in self.eda_unicos])
+        sim_topo = np.array([comparar_topoforma(v_topo, u) for u in self.topo_unicos])
+        sim = (sim_eda[self.eda_cod] + sim_topo[self.topo_cod]) / 2
+        return pd.Series(sim, index=self.cvegeo)
+
+    def comparar_lote(self, pares):
+        sim = np.full(len(pares), np.nan)
+        for k, (a, b) in enumerate(pares):
+            valor = self.comparar(a, b)
+            if valor is not None:
+                sim[k] = valor
+        return sim
+
+
+@lru_cache(maxsize=None)
+def indice_categorico():
+    """IndiceCategorico sobre los datos cargados; se construye una sola vez."""
+    return IndiceCategorico(*datos_categoricos())
+
+
 # =======================================================
 # COMPARADOR PRINCIPAL
 # =======================================================
@@ -93,27 +180,12 @@ def comparar_municipios(mun1, mun2):
     - Topoforma
     Retorna una similitud [0,1].
     """
+    return indice_categorico().comparar(mun1, mun2)
 
-    mun1 = normalizar_cvegeo(mun1)
-    mun2 = normalizar_cvegeo(mun2)
-
-    fila_eda_m1 = edafologia[edafologia["CVEGEO"] == mun1]
-    fila_eda_m2 = edafologia[edafologia["CVEGEO"] == mun2]
-    fila_topo_m1 = topoforma[topoforma["CVEGEO"] == mun1]
-    fila_topo_m2 = topoforma[topoforma["CVEGEO"] == mun2]
-
-    if fila_eda_m1.empty or fila_eda_m2.empty:
-        return None
-    if fila_topo_m1.empty or fila_topo_m2.empty:
-        return None
-
-    v1_eda = unir_edafologia(fila_eda_m1.iloc[0])
-    v2_eda = unir_edafologia(fila_eda_m2.iloc[0])
 
-    v1_topo = limpiar_texto(fila_topo_m1.iloc[0]["CLAVE"])
-    v2_topo = limpiar_texto(fila_topo_m2.iloc[0]["CLAVE"])
-
-    return modelo_gral(v1_eda, v2_eda, v1_topo, v2_topo)
+def comparar_lote(pares):
+    """Similitud categórica de una lista de pares (cve1, cve2); NaN si falta alguno."""
+    return indice_categorico().comparar_lote(pares)
 
 
 # =======================================================
@@ -123,24 +195,17 @@ def comparar_municipios(mun1, mun2):
 def comparar_municipios_detallado(mun1, mun2):
     mun1 = normalizar_cvegeo(mun1)
     mun2 = normalizar_cvegeo(mun2)
+    indice = indice_categorico()
 
-    fila_eda_m1 = edafologia[edafologia["CVEGEO"] == mun1]
-    fila_eda_m2 = edafologia[edafologia["CVEGEO"] == mun2]
-    fila_topo_m1 = topoforma[topoforma["CVEGEO"] == mun1]
-    fila_topo_m2 = topoforma[topoforma["CVEGEO"] == mun2]
-
-    if fila_eda_m1.empty or fila_eda_m2.empty:
+    if mun1 not in indice.eda or mun2 not in indice.eda:
         print("No hay datos de edafología.")
         return
-    if fila_topo_m1.empty or fila_topo_m2.empty:
+    if mun1 not in indice.topo or mun2 not in indice.topo:
         print("No hay datos de topoforma.")
         return
 
-    v1_eda = unir_edafologia(fila_eda_m1.iloc[0])
-    v2_eda = unir_edafologia(fila_eda_m2.iloc[0])
-
-    v1_topo = limpiar_texto(fila_topo_m1.iloc[0]["CLAVE"])
-    v2_topo = limpiar_texto(fila_topo_m2.iloc[0]["CLAVE"])
+    v1_eda, v2_eda = indice.eda[mun1], indice.eda[mun2]
+    v1_topo, v2_topo = indice.topo[mun1], indice.topo[mun2]
 
     sim_eda = comparar_edafologia(v1_eda, v2_eda)
     sim_topo = comparar_topoforma(v1_topo, v2_topo)
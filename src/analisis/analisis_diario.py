@@ -11,6 +11,23 @@ def tiene_hora(serie_fecha: pd.Series) -> bool:
     return serie_fecha.dt.hour.nunique() > 1 or serie_fecha.dt.minute.nunique() > 1
 
 
+# ============================================================
+# Método de agregación horario → diario según la variable
+# ============================================================
+def elegir_metodo(var_col, metodo_horario="auto"):
+    """
+    'sum' para precipitación y evaporación, 'mean' para lo demás,
+    salvo que metodo_horario lo fije explícitamente.
+    """
+    if metodo_horario != "auto":
+        return metodo_horario
+    if "prec" in var_col.lower():
+        return "sum"
+    if "evap" in var_col.lower() or "eva" in var_col.lower():
+        return "sum"
+    return "mean"
+
+
 # ============================================================
 # Convierte datos horarios a datos diarios (sumando o promediando)
 # ============================================================
@@ -19,16 +36,14 @@ def convertir_a_diario(df, fecha_col, id_col, var_col, metodo="sum"):
     Convierte datos con fecha-hora a datos diarios.
     metodo: 'sum' (precipitación, evaporación) o 'mean' (temperaturas)
     """
-    df["fecha"] = df[fecha_col].dt.date
+    # floor a día sobre datetime64 (sin columna de objetos `date`)
+    dia = df[fecha_col].dt.floor("D").rename(fecha_col)
+    grupos = df[var_col].groupby([df[id_col], dia], sort=True, observed=True)
 
     if metodo == "sum":
-        df_diario = df.groupby([id_col, "fecha"])[var_col].sum().reset_index()
+        df_diario = grupos.sum().reset_index()
     else:
-        df_diario = df.groupby([id_col, "fecha"])[var_col].mean().reset_index()
-
-    # Renombra fecha → mantener consistencia
-    df_diario.rename(columns={"fecha": fecha_col}, inplace=True)
-    df_diario[fecha_col] = pd.to_datetime(df_diario[fecha_col])
+        df_diario = grupos.mean().reset_index()
 
     return df_diario
 
@@ -40,13 +55,56 @@ def interpolar_por_municipio(df, id_col, fecha_col, var_col):
     """
     Interpola valores faltantes por municipio.
     Supone que df está ordenado por fecha.
+
+    Las series se acomodan en un array denso (municipio × posición en el
+    tiempo) y se interpola linealmente sobre el eje del tiempo de forma
+    vectorizada. Mismo resultado que Series.interpolate(method="linear")
+    por municipio: los NaN iniciales se quedan y los finales toman el
+    último valor válido.
     """
-    return (
-        df.set_index(fecha_col)
-          .groupby(id_col)[var_col]
-          .apply(lambda s: s.interpolate(method="linear"))
-          .reset_index()
-    )
+    # orden estable por municipio (como groupby), manteniendo el orden temporal
+    df = df[[id_col, fecha_col, var_col]].sort_values(id_col, kind="stable")
+    codigos, _ = pd.factorize(df[id_col], sort=True)
+    posicion = df.groupby(id_col, sort=False, observed=True).cumcount().to_numpy()
+
+    n_mun = codigos.max() + 1 if len(codigos) else 0
+    largo = posicion.max() + 1 if len(posicion) else 0
+    A = np.full((n_mun, largo), np.nan)
+    A[codigos, posicion] = df[var_col].to_numpy(dtype=np.float64)
+
+    A = interpolar_filas(A)
+
+    return pd.DataFrame({
+        id_col: df[id_col].to_numpy(),
+        fecha_col: df[fecha_col].to_numpy(),
+        var_col: A[codigos, posicion],
+    })
+
+
+def interpolar_filas(A):
+    """
+    Interpolación lineal por posición a lo largo del eje 1 de A (2-D).
+    NaN iniciales se conservan; NaN finales toman el último valor válido.
+    """
+    n_filas, L = A.shape
+    columnas = np.arange(L)
+    validos = ~np.isnan(A)
+
+    # índice del último válido a la izquierda y del primero a la derecha
+    previo = np.maximum.accumulate(np.where(validos, columnas, -1), axis=1)
+    siguiente = np.minimum.accumulate(np.where(validos, columnas, L)[:, ::-1], axis=1)[:, ::-1]
+
+    filas = np.arange(n_filas)[:, None]
+    v_prev = A[filas, np.maximum(previo, 0)]
+    v_sig = A[filas, np.minimum(siguiente, L - 1)]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        t = (columnas - previo) / (siguiente - previo)
+        interp = v_prev + (v_sig - v_prev) * t
+
+    huecos = ~validos & (previo >= 0)
+    interp = np.where(siguiente >= L, v_prev, interp)
+    return np.where(huecos, interp, A)
 
 
 # ============================================================
@@ -88,15 +146,7 @@ def analizar_series_diarias(
         print("→ Tiene hora. Convirtiendo a formato diario...")
 
         # Selección automática de método según variable
-        if metodo_horario == "auto":
-            if "prec" in var_col.lower():
-                metodo = "sum"
-            elif "evap" in var_col.lower() or "eva" in var_col.lower():
-                metodo = "sum"
-            else:
-                metodo = "mean"
-        else:
-            metodo = metodo_horario
+        metodo = elegir_metodo(var_col, metodo_horario)
 
         df = convertir_a_diario(df, fecha_col, id_col, var_col, metodo)
         print(f"Conversión completada con método: {metodo}")
@@ -131,6 +181,137 @@ def analizar_series_diarias(
     return df_interp
 
 
+# ============================================================
+# ANÁLISIS EN STREAMING (parquet grande, por row groups)
+# ============================================================
+def _fechas(serie):
+    return pd.to_datetime(serie, errors="coerce")
+
+
+def tiene_hora_dataset(dataset, fecha_col, batch_size=1_000_000):
+    """
+    Igual que tiene_hora pero leyendo sólo la columna de fechas por lotes.
+    """
+    horas, minutos = set(), set()
+    for batch in dataset.to_batches(columns=[fecha_col], batch_size=batch_size):
+        fechas = _fechas(batch.column(0).to_pandas()).dropna()
+        horas.update(fechas.dt.hour.unique().tolist())
+        minutos.update(fechas.dt.minute.unique().tolist())
+        if len(horas) > 1 or len(minutos) > 1:
+            return True
+    return False
+
+
+def _compactar(parciales, id_col, fecha_col):
+    """Combina agregados parciales (suma, conteo) por (municipio, día)."""
+    df = pd.concat(parciales)
+    return [df.groupby(level=[id_col, fecha_col], sort=False).sum()]
+
+
+def diario_por_lotes(dataset, id_col, fecha_col, var_col, metodo,
+                     batch_size=1_000_000, compactar_cada=32):
+    """
+    Agrega horario → diario en una sola pasada por el parquet, por lotes de
+    filas. Cada lote aporta (suma, conteo) por (municipio, día); los
+    parciales se combinan periódicamente, así la memoria queda acotada por
+    el agregado diario (~24 veces menor que el horario), sin importar el
+    orden de las filas en el archivo.
+    """
+    parciales = []
+    for batch in dataset.to_batches(columns=[id_col, fecha_col, var_col],
+                                    batch_size=batch_size):
+        b = batch.to_pandas()
+        dia = _fechas(b[fecha_col]).dt.floor("D").rename(fecha_col)
+        parciales.append(b[var_col].groupby([b[id_col], dia], sort=False).agg(["sum", "count"]))
+        if len(parciales) >= compactar_cada:
+            parciales = _compactar(parciales, id_col, fecha_col)
+
+    if not parciales:
+        return pd.DataFrame(columns=[id_col, fecha_col, var_col])
+
+    total = _compactar(parciales, id_col, fecha_col)[0]
+    if metodo == "sum":
+        valores = total["sum"]
+    else:
+        valores = total["sum"] / total["count"].where(total["count"] > 0)
+
+    return valores.rename(var_col).reset_index()
+
+
+def analizar_series_diarias_streaming(
+    path_parquet: str,
+    var_col: str,
+    id_col: str = "CVEGEO",
+    fecha_col: str = "valid_time",
+    output_path: str = "series_limpias.parquet",
+    metodo_horario="auto",
+    batch_size=1_000_000,
+    municipios_por_lote=200
+):
+    """
+    Variante de analizar_series_diarias para parquets horarios que no caben
+    en RAM.
+
+    1. Detecta hora leyendo sólo la columna de fechas (se detiene en cuanto
+       ve horas distintas).
+    2. Una sola pasada por lotes agrega a diario por (municipio, día); si
+       el archivo ya es diario, se leen sólo las tres columnas.
+    3. Interpola por grupos de `municipios_por_lote` municipios y escribe
+       cada grupo al parquet de salida antes de pasar al siguiente.
+
+    La memoria pico es la del agregado diario (no la del horario) más un
+    grupo. No depende de que el archivo esté ordenado o particionado por
+    municipio: exportaciones ordenadas por tiempo se leen una sola vez.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    print("-----------------------------------------------------------")
+    print(f"Abriendo dataset (streaming): {path_parquet}")
+    dataset = ds.dataset(path_parquet, format="parquet")
+
+    print("Detectando si la columna de fechas contiene hora...")
+    if tiene_hora_dataset(dataset, fecha_col, batch_size):
+        metodo = elegir_metodo(var_col, metodo_horario)
+        print(f"→ Tiene hora. Agregando a diario en una pasada (método: {metodo})...")
+        diario = diario_por_lotes(dataset, id_col, fecha_col, var_col, metodo, batch_size)
+    else:
+        print("→ Ya es diario. No se requiere conversión.")
+        diario = dataset.to_table(columns=[id_col, fecha_col, var_col]).to_pandas()
+        diario[fecha_col] = _fechas(diario[fecha_col])
+
+    diario = diario.sort_values(by=[id_col, fecha_col], kind="stable").reset_index(drop=True)
+
+    # inicio de cada municipio en el diario ordenado -> cortes por grupo
+    ids = diario[id_col].to_numpy()
+    inicios = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.empty(0, int)
+    cortes = np.r_[inicios[::municipios_por_lote], len(ids)]
+    print(f"Municipios: {len(inicios)}, grupos de {municipios_por_lote}")
+
+    faltantes_ini = int(diario[var_col].isna().sum())
+    faltantes_final = 0
+    escritor = None
+    try:
+        for a, b in zip(cortes[:-1], cortes[1:]):
+            lote = interpolar_por_municipio(diario.iloc[a:b], id_col, fecha_col, var_col)
+            faltantes_final += int(lote[var_col].isna().sum())
+
+            tabla = pa.Table.from_pandas(lote, preserve_index=False)
+            if escritor is None:
+                escritor = pq.ParquetWriter(output_path, tabla.schema)
+            escritor.write_table(tabla)
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+    print(f"Valores faltantes antes de interpolar: {faltantes_ini}")
+    print(f"Valores faltantes después de interpolación: {faltantes_final}")
+    print(f"Archivo limpio guardado en: {output_path}")
+    print("-----------------------------------------------------------")
+    return output_path
+
+
 # ============================================================
 # Script ejecutable
 # ============================================================
@@ -141,10 +322,12 @@ if __name__ == "__main__":
     parser.add_argument("--input", required=True, help="Ruta del parquet de entrada")
     parser.add_argument("--variable", required=True, help="Nombre de la columna de variable (prec, t2m, evavt, etc.)")
     parser.add_argument("--output", required=True, help="Ruta del parquet limpio de salida")
+    parser.add_argument("--streaming", action="store_true", help="Procesar por lotes (archivos que no caben en RAM)")
 
     args = parser.parse_args()
 
-    analizar_series_diarias(
+    analisis = analizar_series_diarias_streaming if args.streaming else analizar_series_diarias
+    analisis(
         path_parquet=args.input,
         var_col=args.variable,
         output_path=args.output
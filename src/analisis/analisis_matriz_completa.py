@@ -3,6 +3,10 @@
 import pandas as pd
 import numpy as np
 import h5py
+from src.utils.topk import topk_bloque
+
+# Memoria máxima de los temporales (lote, vecinos, tiempos) de promedio_vecinos
+PRESUPUESTO_BYTES = 256 * 2**20
 
 
 # ------------------------------------------------------------
@@ -75,10 +79,154 @@ def rellenar_un_municipio(cvegeo_faltante, matriz_sim, df_incompleto, top_n=5):
 
 
 # ------------------------------------------------------------
-# 6. COMPLETAR TODO EL DATASET
+# 6. IMPUTACIÓN EN LOTE (VECTORIZADA)
 # ------------------------------------------------------------
 
-def completar_dataset(df_incompleto, matriz_sim, lista_cvegeo, top_n=5):
+def pivotar_dataset(df_incompleto):
+    """
+    Pivota el dataset largo una sola vez a (municipio × tiempo).
+    Devuelve (cvegeo, tiempos, W) con NaN donde no hay dato.
+    """
+    tabla = df_incompleto.pivot_table(
+        index="CVEGEO",
+        columns="valid_time",
+        values="variable",
+        aggfunc="mean"
+    ).sort_index(axis=1)
+
+    return tabla.index.tolist(), tabla.columns, tabla.to_numpy(dtype=np.float64)
+
+
+def similitudes_faltantes(faltantes, matriz_sim):
+    """
+    Filas de similitud de los faltantes (f, N) y la columna propia de cada uno.
+    """
+    posicion = {c: i for i, c in enumerate(matriz_sim.index)}
+    sin_matriz = [c for c in faltantes if c not in posicion]
+    if sin_matriz:
+        raise ValueError(f"{sin_matriz[0]} no está en la matriz de similitud")
+
+    filas = np.array([posicion[c] for c in faltantes], dtype=np.int64)
+    # misma posición en columnas: la matriz es cuadrada con el mismo orden
+    columnas = matriz_sim.columns.get_indexer(matriz_sim.index[filas])
+    return matriz_sim.to_numpy()[filas], columnas
+
+
+def promedio_vecinos(W, filas_vecinos, pesos=None, presupuesto=PRESUPUESTO_BYTES):
+    """
+    Promedio (ponderado si se dan pesos) de las series de los vecinos.
+    filas_vecinos: (f, n) índices de fila en W; -1 = vecino sin datos.
+    Devuelve (X (f, T), conteo (f, T)) con NaN donde ningún vecino tiene dato.
+
+    Pesos: los negativos se recortan a 0. Si en un tiempo todos los vecinos
+    con dato pesan 0, se usa el promedio simple de esos vecinos (así un
+    vecino con similitud <= 0 nunca se descarta en silencio).
+    Se procesa por lotes de faltantes para que (lote, n, T) quepa en
+    `presupuesto` bytes.
+    """
+    f, n = filas_vecinos.shape
+    T = W.shape[1]
+    validos = filas_vecinos >= 0
+    if pesos is None:
+        pesos = np.ones(filas_vecinos.shape)
+    pesos = np.where(validos, np.clip(pesos, 0.0, None), 0.0)
+
+    X = np.full((f, T), np.nan)
+    conteo = np.zeros((f, T), dtype=np.int64)
+    # V, máscara y dos temporales de (lote, n, T) float64
+    lote = max(1, int(presupuesto // (4 * max(1, n * T) * 8)))
+    for s in range(0, f, lote):
+        filas = filas_vecinos[s:s + lote]
+        V = W[np.maximum(filas, 0)]                       # (lote, n, T)
+        presentes = ~np.isnan(V) & validos[s:s + lote, :, None]
+        V = np.where(presentes, V, 0.0)
+        w = np.where(presentes, pesos[s:s + lote, :, None], 0.0)
+
+        cuenta = presentes.sum(axis=1)
+        total = w.sum(axis=1)
+        suma = np.einsum("fnt,fnt->ft", V, w)
+        simple = total == 0
+        suma[simple] = V.sum(axis=1)[simple]
+        total = np.where(simple, cuenta, total)
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            X[s:s + lote] = np.where(cuenta > 0, suma / total, np.nan)
+        conteo[s:s + lote] = cuenta
+    return X, conteo
+
+
+def series_a_largo(cvegeo, tiempos, X):
+    """
+    Convierte (f × T) a formato largo con el mismo esquema que imputar_serie:
+    columnas valid_time, variable, CVEGEO. Omite tiempos sin dato.
+    """
+    f, T = X.shape
+    validos = ~np.isnan(X)
+    filas, cols = np.nonzero(validos)
+    return pd.DataFrame({
+        "valid_time": np.asarray(tiempos)[cols],
+        "variable": X[filas, cols],
+        "CVEGEO": np.asarray(cvegeo, dtype=object)[filas],
+    })
+
+
+def imputar_lote(df_incompleto, matriz_sim, faltantes, top_n=5,
+                 ponderado=False, solo_con_datos=False, pasadas=1):
+    """
+    Imputa todos los faltantes de una vez: pivot único, top-n de todos los
+    faltantes con una selección top-k y promedio de vecinos como operación
+    matricial.
+
+    Con las opciones por defecto da el mismo resultado que
+    rellenar_un_municipio para cada faltante. Opciones:
+    - ponderado: promedio ponderado por la similitud de cada vecino
+      (ver promedio_vecinos para similitudes <= 0).
+    - solo_con_datos: ignora vecinos sin datos y sigue bajando en el
+      ranking hasta encontrar top_n con datos.
+    - pasadas: con > 1, los municipios ya imputados sirven como vecinos
+      en las pasadas siguientes y las imputaciones se recalculan.
+    """
+    cvegeo_datos, tiempos, W = pivotar_dataset(df_incompleto)
+    m, f = len(cvegeo_datos), len(faltantes)
+    S, columnas_propias = similitudes_faltantes(faltantes, matriz_sim)
+
+    # fila de cada columna de la matriz en Wt = [datos; faltantes] (-1 si no está)
+    Wt = np.vstack([W, np.full((f, W.shape[1]), np.nan)])
+    fila_columna = pd.Index(list(cvegeo_datos) + list(faltantes)).get_indexer(matriz_sim.columns)
+
+    for _ in range(max(1, pasadas)):
+        tiene_datos = np.zeros(Wt.shape[0], dtype=bool)
+        tiene_datos[:m] = True
+        tiene_datos[m:] = ~np.isnan(Wt[m:]).all(axis=1)
+        disponibles = (fila_columna >= 0) & tiene_datos[np.maximum(fila_columna, 0)]
+
+        S_eff = np.where(disponibles[None, :], S, -np.inf) if solo_con_datos else S
+        idx, sim = topk_bloque(S_eff, top_n, excluir=columnas_propias)
+
+        filas_vecinos = np.where(idx >= 0, fila_columna[idx], -1)
+        filas_vecinos[~disponibles[idx] | ~np.isfinite(sim)] = -1
+
+        X, _ = promedio_vecinos(Wt, filas_vecinos, sim if ponderado else None)
+        Wt[m:] = X
+
+    sin_vecinos = ~(filas_vecinos >= 0).any(axis=1)
+    if sin_vecinos.any():
+        cve = faltantes[int(np.argmax(sin_vecinos))]
+        raise ValueError(f"Vecinos de {cve} no tienen series.")
+
+    return series_a_largo(faltantes, tiempos, Wt[m:])
+
+
+# ------------------------------------------------------------
+# 7. COMPLETAR TODO EL DATASET
+# ------------------------------------------------------------
+
+def completar_dataset(df_incompleto, matriz_sim, lista_cvegeo, top_n=5, modo="lote",
+                      ponderado=False, solo_con_datos=False, pasadas=1):
+    """
+    modo: 'lote' (vectorizado, por defecto) o 'secuencial' (un municipio a la vez).
+    ponderado, solo_con_datos, pasadas: opciones de imputar_lote (sólo modo 'lote').
+    """
     df = df_incompleto.copy()
 
     cvegeo_existentes = set(df["CVEGEO"].unique())
@@ -90,10 +238,20 @@ def completar_dataset(df_incompleto, matriz_sim, lista_cvegeo, top_n=5):
 
     imputaciones = []
 
-    for cve in faltantes:
-        print(f"→ Imputando {cve} usando top-{top_n} similares...")
-        nueva_serie = rellenar_un_municipio(cve, matriz_sim, df, top_n)
-        imputaciones.append(nueva_serie)
+    if modo == "lote":
+        if faltantes:
+            print(f"→ Imputando {len(faltantes)} municipios en lote usando top-{top_n} similares...")
+            imputaciones.append(imputar_lote(
+                df, matriz_sim, faltantes, top_n,
+                ponderado=ponderado, solo_con_datos=solo_con_datos, pasadas=pasadas
+            ))
+    elif modo == "secuencial":
+        for cve in faltantes:
+            print(f"→ Imputando {cve} usando top-{top_n} similares...")
+            nueva_serie = rellenar_un_municipio(cve, matriz_sim, df, top_n)
+            imputaciones.append(nueva_serie)
+    else:
+        raise ValueError(f"Modo no soportado: {modo}")
 
     if imputaciones:
         df_completo = pd.concat([df] + imputaciones, ignore_index=True)
@@ -106,7 +264,7 @@ def completar_dataset(df_incompleto, matriz_sim, lista_cvegeo, top_n=5):
 
 
 # ------------------------------------------------------------
-# 7. MAIN
+# 8. MAIN
 # ------------------------------------------------------------
 
 if __name__ == "__main__":
@@ -1,5 +1,6 @@
 import numpy as np
 import pandas as pd
+from functools import lru_cache
 from joblib import Parallel, delayed
 from data.acceso_data import cargar_numericos, cargar_municipios
 from src.utils.helpers import normalizar_cvegeo, Progreso
@@ -18,6 +19,31 @@ def similitud_proporcional(x1, x2):
     diff = abs(x1 - x2)
     return 1 - (diff / max_val) if max_val != 0 else 0.0
 
+def similitud_proporcional_pares(x, y):
+    """
+    similitud_proporcional elemento a elemento (con broadcasting de numpy).
+    Mismo comportamiento que la escalar, incluidos los casos con cero:
+    0/0 -> 1.0 y max_val == 0 -> 0.0.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    ax, ay = np.abs(x), np.abs(y)
+    # igual que max() de Python: devuelve el primero salvo que el segundo sea mayor
+    max_val = np.where(ay > ax, ay, ax)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sim = 1 - np.abs(x - y) / max_val
+    sim = np.where(max_val == 0, 0.0, sim)
+    return np.where((x == 0) & (y == 0), 1.0, sim)
+
+def similitud_proporcional_matriz(x, y):
+    """
+    Versión vectorizada de similitud_proporcional.
+    x: array (a,), y: array (b,) -> matriz (a, b) con la similitud de cada par.
+    """
+    x = np.asarray(x, dtype=np.float64)[:, None]
+    y = np.asarray(y, dtype=np.float64)[None, :]
+    return similitud_proporcional_pares(x, y)
+
 def es_numerico(valor):
     try:
         float(valor)
@@ -50,51 +76,145 @@ def comparar_valores_num(v1, v2):
     return 0.0
 
 # =======================================================
-# CARGA DE DATOS
+# CARGA DE DATOS (PEREZOSA Y CACHEADA)
 # =======================================================
-precipitacion, temperatura, unidades_climaticas = cargar_numericos()
-municipios = cargar_municipios()
+@lru_cache(maxsize=None)
+def datos_numericos():
+    """(precipitacion, temperatura, unidades_climaticas); se leen la primera vez que se piden."""
+    return cargar_numericos()
+
+@lru_cache(maxsize=None)
+def datos_municipios():
+    """Tabla de municipios; se lee de disco la primera vez que se pide."""
+    return cargar_municipios()
+
+def __getattr__(nombre):
+    # compatibilidad: las tablas siguen disponibles como atributos del módulo
+    tablas = ("precipitacion", "temperatura", "unidades_climaticas")
+    if nombre in tablas:
+        return datos_numericos()[tablas.index(nombre)]
+    if nombre == "municipios":
+        return datos_municipios()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
 
 # =======================================================
-# COMPARADOR PRINCIPAL
+# ÍNDICE EN MEMORIA POR CVEGEO
 # =======================================================
-def comparar_municipios_num(mun1, mun2):
+def _campo_num(valores):
     """
-    Compara dos municipios usando solo datos numéricos:
-    precipitación, temperatura y unidad climática.
+    Preprocesa una columna RANGOS para comparar_valores_num vectorizado:
+    guarda el valor como número y como rango, con banderas de tipo.
     """
-    mun1 = normalizar_cvegeo(mun1)
-    mun2 = normalizar_cvegeo(mun2)
+    es_num = np.array([es_numerico(v) for v in valores], dtype=bool)
+    es_rng = np.array([es_rango(v) for v in valores], dtype=bool)
+    num = np.array([float(v) if e else np.nan for v, e in zip(valores, es_num)], dtype=np.float64)
+    rng = np.array([rango_a_promedio(v) if e else np.nan for v, e in zip(valores, es_rng)], dtype=np.float64)
+    return {"num": num, "rango": rng, "es_num": es_num, "es_rango": es_rng}
 
-    fila_prec1 = precipitacion[precipitacion["CVEGEO"] == mun1]
-    fila_prec2 = precipitacion[precipitacion["CVEGEO"] == mun2]
 
-    fila_temp1 = temperatura[temperatura["CVEGEO"] == mun1]
-    fila_temp2 = temperatura[temperatura["CVEGEO"] == mun2]
-
-    fila_uni1 = unidades_climaticas[unidades_climaticas["CVEGEO"] == mun1]
-    fila_uni2 = unidades_climaticas[unidades_climaticas["CVEGEO"] == mun2]
-
-    if fila_prec1.empty or fila_prec2.empty:
-        return None
-    if fila_temp1.empty or fila_temp2.empty:
-        return None
-    if fila_uni1.empty or fila_uni2.empty:
-        return None
+def _comparar_campo(c, i, j):
+    """
+    comparar_valores_num vectorizado entre las posiciones i y j (arrays)
+    de un campo preprocesado; respeta el mismo orden de casos.
+    """
+    en1, en2 = c["es_num"][i], c["es_num"][j]
+    er1, er2 = c["es_rango"][i], c["es_rango"][j]
+    n1, n2 = c["num"][i], c["num"][j]
+    r1, r2 = c["rango"][i], c["rango"][j]
+
+    casos = [
+        (en1 & en2, n1, n2),
+        (er1 & er2, r1, r2),
+        (er1 & en2, r1, n2),
+        (er2 & en1, n1, r2),
+    ]
+    sim = np.zeros(np.broadcast(i, j).shape)
+    pendiente = np.ones(sim.shape, dtype=bool)
+    for mascara, a, b in casos:
+        m = pendiente & mascara
+        if m.any():
+            sim[m] = similitud_proporcional_pares(np.broadcast_to(a, m.shape)[m],
+                                                  np.broadcast_to(b, m.shape)[m])
+        pendiente &= ~mascara
+    return sim
+
+
+class IndiceNumerico:
+    """
+    Índice en memoria por CVEGEO de los valores numéricos preprocesados.
 
-    v_prec1 = fila_prec1.iloc[0]["RANGOS"]
-    v_prec2 = fila_prec2.iloc[0]["RANGOS"]
+    - comparar(m1, m2): O(1), mismo valor que comparar_municipios_num
+    - uno_contra_todos(m): Serie con la similitud de m contra todos
+    - comparar_lote(pares): array con la similitud de cada par (NaN si falta)
+    """
 
-    v_temp1 = fila_temp1.iloc[0]["RANGOS"]
-    v_temp2 = fila_temp2.iloc[0]["RANGOS"]
+    def __init__(self, precipitacion, temperatura, unidades_climaticas):
+        # como el filtrado original, se usa la primera fila de cada CVEGEO
+        prec = precipitacion.drop_duplicates("CVEGEO").set_index("CVEGEO")["RANGOS"]
+        temp = temperatura.drop_duplicates("CVEGEO").set_index("CVEGEO")["RANGOS"]
+        uni = unidades_climaticas.drop_duplicates("CVEGEO").set_index("CVEGEO")["TIPO_N"]
+
+        comunes = set(prec.index) & set(temp.index) & set(uni.index)
+        self.cvegeo = [c for c in prec.index if c in comunes]
+        self.posicion = {c: i for i, c in enumerate(self.cvegeo)}
+
+        self.crudos = {c: (prec[c], temp[c], uni[c]) for c in self.cvegeo}
+        self.prec = _campo_num(prec.loc[self.cvegeo].tolist())
+        self.temp = _campo_num(temp.loc[self.cvegeo].tolist())
+        self.uni = uni.loc[self.cvegeo].to_numpy(dtype=np.float64)
+
+    def comparar(self, mun1, mun2):
+        v1 = self.crudos.get(normalizar_cvegeo(mun1))
+        v2 = self.crudos.get(normalizar_cvegeo(mun2))
+        if v1 is None or v2 is None:
+            return None
+
+        sim_prec = comparar_valores_num(v1[0], v2[0])
+        sim_temp = comparar_valores_num(v1[1], v2[1])
+        sim_uni  = similitud_proporcional(v1[2], v2[2])
+        return (sim_prec + sim_temp + sim_uni) / 3
+
+    def _similitud(self, i, j):
+        return (_comparar_campo(self.prec, i, j) +
+                _comparar_campo(self.temp, i, j) +
+                similitud_proporcional_pares(self.uni[i], self.uni[j])) / 3
+
+    def uno_contra_todos(self, mun):
+        i = self.posicion.get(normalizar_cvegeo(mun))
+        if i is None:
+            return None
+        todos = np.arange(len(self.cvegeo))
+        return pd.Series(self._similitud(i, todos), index=self.cvegeo)
+
+    def comparar_lote(self, pares):
+        pos = [(self.posicion.get(normalizar_cvegeo(a), -1),
+                self.posicion.get(normalizar_cvegeo(b), -1)) for a, b in pares]
+        pos = np.array(pos, dtype=np.int64).reshape(-1, 2)
+        validos = (pos >= 0).all(axis=1)
+
+        sim = np.full(len(pos), np.nan)
+        if validos.any():
+            sim[validos] = self._similitud(pos[validos, 0], pos[validos, 1])
+        return sim
+
+
+@lru_cache(maxsize=None)
+def indice_numerico():
+    """IndiceNumerico sobre los datos cargados; se construye una sola vez."""
+    return IndiceNumerico(*datos_numericos())
 
-    v_uni1 = fila_uni1.iloc[0]["TIPO_N"]
-    v_uni2 = fila_uni2.iloc[0]["TIPO_N"]
 
-    sim_prec = comparar_valores_num(v_prec1, v_prec2)
-    sim_temp = comparar_valores_num(v_temp1, v_temp2)
-    sim_uni  = similitud_proporcional(v_uni1, v_uni2)
+# =======================================================
+# COMPARADOR PRINCIPAL
+# =======================================================
+def comparar_municipios_num(mun1, mun2):
+    """
+    Compara dos municipios usando solo datos numéricos:
+    precipitación, temperatura y unidad climática.
+    """
+    return indice_numerico().comparar(mun1, mun2)
 
-    return (sim_prec + sim_temp + sim_uni) / 3 # Promedio de similitudes
 
- 
\ No newline at end of file
+def comparar_lote_num(pares):
+    """Similitud numérica de una lista de pares (cve1, cve2); NaN si falta alguno."""
+    return indice_numerico().comparar_lote(pares)
@@ -0,0 +1,118 @@
+# consultas uno-contra-todos sobre la matriz general guardada en H5
+
+from collections import OrderedDict
+import h5py
+import numpy as np
+import pandas as pd
+from src.utils.topk import topk_bloque, topk_matriz
+
+
+# ------------------------------------------------------------
+# 1. CONSULTA SOBRE LA MATRIZ H5
+# ------------------------------------------------------------
+
+class ConsultaSimilitud:
+    """
+    Capa de consulta sobre una matriz de similitud H5 ('matriz', 'cvegeo')
+    sin cargarla completa en RAM.
+
+    - Si el dataset es contiguo y sin compresión se abre con np.memmap;
+      si no, se leen filas sueltas con h5py.
+    - Las filas consultadas se guardan en una caché LRU (`cache_filas`).
+    - Con `k_indice` se precalcula un índice top-k (N, k) para responder
+      top_n(n <= k_indice) sin leer la matriz.
+    """
+
+    def __init__(self, path, cache_filas=1024, k_indice=None, dataset="matriz",
+                 bloque_filas=512):
+        self.path = path
+        self._h5 = h5py.File(path, "r")
+        self._dset = self._h5[dataset]
+        self.cvegeo = [c.decode("utf-8") if isinstance(c, bytes) else str(c)
+                       for c in self._h5["cvegeo"][:]]
+        self.posicion = {c: i for i, c in enumerate(self.cvegeo)}
+        self._nodos = np.asarray(self.cvegeo, dtype=object)
+
+        mmap = self._abrir_mmap()
+        self._matriz = mmap if mmap is not None else self._dset
+        self.cache_filas = cache_filas
+        self._cache = OrderedDict()
+
+        self.vecinos = None
+        self.pesos = None
+        if k_indice:
+            self.vecinos, self.pesos = topk_matriz(self._matriz, k_indice,
+                                                   bloque_filas=bloque_filas)
+
+    def _abrir_mmap(self):
+        """np.memmap del dataset si está guardado contiguo; si no, None."""
+        offset = self._dset.id.get_offset()
+        if offset is None or self._dset.compression is not None:
+            return None
+        return np.memmap(self.path, dtype=self._dset.dtype, mode="r",
+                         offset=offset, shape=self._dset.shape)
+
+    def cerrar(self):
+        self._matriz = None
+        self._h5.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    # --------------------------------------------------------
+    # Lectura de filas con caché LRU
+    # --------------------------------------------------------
+
+    def _indice(self, cvegeo):
+        if cvegeo not in self.posicion:
+            raise ValueError(f"{cvegeo} no está en la matriz de similitud")
+        return self.posicion[cvegeo]
+
+    def fila(self, cvegeo):
+        """Fila completa de similitudes de `cvegeo` (array de tamaño N)."""
+        i = self._indice(cvegeo)
+        if i in self._cache:
+            self._cache.move_to_end(i)
+            return self._cache[i]
+
+        fila = np.asarray(self._matriz[i])
+        self._cache[i] = fila
+        if len(self._cache) > self.cache_filas:
+            self._cache.popitem(last=False)
+        return fila
+
+    # --------------------------------------------------------
+    # Consultas
+    # --------------------------------------------------------
+
+    def top_n(self, cvegeo, top_n=5):
+        """Serie con los top_n municipios más similares (sin incluirse a sí mismo)."""
+        i = self._indice(cvegeo)
+        if self.vecinos is not None and top_n <= self.vecinos.shape[1]:
+            idx, w = self.vecinos[i, :top_n], self.pesos[i, :top_n]
+        else:
+            idx, w = topk_bloque(self.fila(cvegeo)[None, :], top_n, fila_inicial=i)
+            idx, w = idx[0], w[0]
+        validos = idx >= 0              # sin los huecos de relleno (NaN)
+        return pd.Series(w[validos], index=self._nodos[idx[validos]].tolist())
+
+    def umbral(self, cvegeo, minimo):
+        """Serie con los municipios cuya similitud con `cvegeo` es >= minimo."""
+        i = self._indice(cvegeo)
+        fila = self.fila(cvegeo)
+        idx = np.flatnonzero(fila >= minimo)
+        idx = idx[idx != i]
+        idx = idx[np.argsort(-fila[idx], kind="stable")]
+        return pd.Series(fila[idx], index=self._nodos[idx].tolist())
+
+    def lote(self, lista_cvegeo, top_n=5):
+        """Diccionario cvegeo -> Serie top_n para varios municipios."""
+        return {c: self.top_n(c, top_n) for c in lista_cvegeo}
+
+    def filas(self, lista_cvegeo):
+        """DataFrame (len(lista) × N) con las filas pedidas."""
+        return pd.DataFrame(np.vstack([self.fila(c) for c in lista_cvegeo]),
+                            index=list(lista_cvegeo), columns=self.cvegeo)
@@ -1,39 +1,26 @@
 # src/brenchmarking/bm_matrizseries_blocks.py
 import time
 import psutil
-import pandas as pd
 import h5py
 import numpy as np
 
 from src.construccion_matriz.matriz_blocks import construir_matriz_similitud_blocks
+from src.utils.almacen_series import obtener_almacen
 
 def main():
     print("\n=== BENCHMARKING MATRIZ POR BLOQUES (L2) ===\n")
 
-    # Carga (archivo WIDE mensual en tu caso)
+    # Carga desde el almacén pre-pivotado (se construye sólo si cambió la fuente):
+    # columnas ordenadas y relleno horizontal de faltantes ya aplicados
     print("Cargando series...")
-    df = pd.read_parquet("data/series_tiempo/Sequia_mensual_completa.parquet")
-    indices = df["CVEGEO"].astype(str).values
-
-    # Eliminar columnas basura si las hay
-    df = df.loc[:, ~df.columns.str.contains("^Unnamed")]
-
-    # Asegurar índice CVEGEO
-    if "CVEGEO" in df.columns:
-        df["CVEGEO"] = df["CVEGEO"].astype(str).str.zfill(5)
-        df = df.set_index("CVEGEO")
-    else:
-        # si ya está indexado, aseguramos formato
-        df.index = df.index.astype(str).str.zfill(5)
-
-    # Asegurar orden de columnas (YYYY-MM lexicográfico funciona)
-    df_wide = df.copy()
-    df_wide = df_wide.sort_index(axis=1)
-
-    # Relleno de faltantes horizontalmente (no eliminamos municipios)
-    df_wide = df_wide.ffill(axis=1).bfill(axis=1)
+    almacen = obtener_almacen(
+        "data/series_tiempo/Sequia_mensual_completa.parquet",
+        "data/almacen/sequia",
+        relleno="ffill_bfill"
+    )
+    df_wide = almacen.valores
 
-    lista_mun = sorted(df_wide.index.tolist())
+    lista_mun = almacen.cvegeo
     print(f"Municipios detectados: {len(lista_mun)}")
     print(f"Fechas por municipio: {df_wide.shape[1]}")
 
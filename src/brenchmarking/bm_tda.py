@@ -1,35 +1,40 @@
 # src/bench/bench_tda.py
 import time, psutil
-from src.utils.tda_cache import generar_y_cachear_diagramas
+from src.utils.tda_cache import generar_y_cachear_diagramas, cargar_diagramas, lista_diagramas
 from src.construccion_matriz.tda_matriz import construir_matriz_tda_from_cache
-from src.utils.tda_vector import diagramas_a_images
-from sklearn.metrics import pairwise_distances
-import h5py
+from src.utils.tda_vector import (
+    diagramas_a_images, comprimir, matriz_distancias_vectores, metricas_aproximacion
+)
 
-def bench(df_series, columna):
+def bench(df_series, columna, resolucion=50, d=64, compresion="pca", comparar_exacta=True):
     t0 = time.perf_counter()
     cache = "data/tda/cache_diagramas.h5"
     generar_y_cachear_diagramas(df_series, columna, cache, n_jobs=-1)
     t1 = time.perf_counter()
     print("Tiempo calcular diagramas:", t1 - t0)
 
-    # cargar diagramas (ejemplo)
-    import pickle
-    with h5py.File(cache, "r") as f:
-        cves = [c.decode() if isinstance(c, bytes) else c for c in f["cvegeo"][:]]
-        grp = f["diagramas"]
-        diagramas = [pickle.loads(grp[c][()]) for c in cves]
+    # cargar diagramas (array concatenado + offsets)
+    cves, puntos, offsets = cargar_diagramas(cache)
+    diagramas = lista_diagramas(puntos, offsets)
 
     t2 = time.perf_counter()
     print("Tiempo cargar diagramas:", t2 - t1)
 
-    X_images = diagramas_a_images(diagramas, n_jobs=-1)
+    X_images = diagramas_a_images(diagramas, n_jobs=-1, image_params={"resolucion": resolucion})
+    X = comprimir(X_images, d, metodo=compresion)
     t3 = time.perf_counter()
-    print("Tiempo persistence images:", t3 - t2)
+    print(f"Tiempo persistence images ({X_images.shape[1]} -> {X.shape[1]} columnas):", t3 - t2)
 
-    D = pairwise_distances(X_images, metric='euclidean', n_jobs=-1).astype('float32')
+    # distancias por tiles directo a HDF5 (sin N×N float64 en memoria)
+    aprox = matriz_distancias_vectores(X, "data/tda/distancias_images.h5", cves)
     t4 = time.perf_counter()
     print("Tiempo pairwise distances:", t4 - t3)
 
+    if comparar_exacta:
+        exacta = construir_matriz_tda_from_cache(cache, "data/tda/distancias_sw.h5", metodo="exacto")
+        t5 = time.perf_counter()
+        print("Tiempo sliced-Wasserstein exacta:", t5 - t4)
+        print("Precisión vs exacta:", metricas_aproximacion(aprox, exacta, k=10))
+
     proceso = psutil.Process()
     print("Memoria final (MB):", proceso.memory_info().rss / 1e6)
@@ -0,0 +1,52 @@
+# python3 -m src.brenchmarking.knn_graph
+import time
+from data.acceso_data import cargar_categoricos, cargar_numericos
+from src.utils.almacen_series import obtener_almacen
+from src.utils.ann import EspacioL2, EspacioProporcional, EspacioCategorico, knn_aproximado, knn_exacto, recall_knn
+from src.utils.grafo import guardar_knn
+from src.construccion_matriz.matriz_numerica import vectores_numericos
+from src.construccion_matriz.matriz_categorica import codigos_categoricos
+
+
+def medir(nombre, cvegeo, espacio, k=10, ruta_salida=None):
+    t0 = time.perf_counter()
+    vecinos, pesos = knn_aproximado(espacio, k, verbose=False)
+    t1 = time.perf_counter()
+    exactos, _ = knn_exacto(espacio, k)
+    t2 = time.perf_counter()
+
+    print(f"[{nombre}] N={len(cvegeo)} | ANN {t1 - t0:.2f} s | exacto {t2 - t1:.2f} s | "
+          f"recall@{k}: {recall_knn(vecinos, exactos):.4f}")
+
+    if ruta_salida:
+        guardar_knn(ruta_salida, cvegeo, vecinos, pesos)
+
+
+def main(k=10):
+    print("\n=== BENCHMARKING k-NN APROXIMADO (RP + NN-descent) ===\n")
+
+    # --- SERIES (almacén denso, similitud L2) ---
+    almacen = obtener_almacen(
+        "data/series_tiempo/Sequia_mensual_completa.parquet",
+        "data/almacen/sequia",
+        relleno="ffill_bfill"
+    )
+    medir("series", almacen.cvegeo, EspacioL2(almacen.valores), k, "outputs/knn_ann_series")
+
+    # --- NUMÉRICOS (similitud proporcional) ---
+    precipitacion, temperatura, unidades_climaticas = cargar_numericos()
+    lista_num = sorted(set(precipitacion["CVEGEO"]) &
+                       set(temperatura["CVEGEO"]) &
+                       set(unidades_climaticas["CVEGEO"]))
+    X = vectores_numericos(lista_num, precipitacion, temperatura, unidades_climaticas)
+    medir("numerica", lista_num, EspacioProporcional(X), k, "outputs/knn_ann_numerica")
+
+    # --- CATEGÓRICOS (códigos + tablas de únicos) ---
+    eda, topo = cargar_categoricos()
+    lista_cat = sorted(set(eda["CVEGEO"]) & set(topo["CVEGEO"]))
+    codigos, tablas = codigos_categoricos(lista_cat, eda, topo)
+    medir("categorica", lista_cat, EspacioCategorico(codigos, tablas), k, "outputs/knn_ann_categorica")
+
+
+if __name__ == "__main__":
+    main()
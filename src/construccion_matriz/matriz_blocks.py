@@ -2,6 +2,10 @@
 
 import numpy as np
 from multiprocessing import Pool, cpu_count
+from src.utils.planificador import generar_tiles, repartir_tiles, reflejar_tile
+from src.utils.memoria_compartida import (
+    MODOS, MatrizCompartida, inicializar_worker, matriz_worker
+)
 
 
 # ======================================
@@ -23,6 +27,108 @@ def distancia_a_similitud(d):
     return 1.0 / (1.0 + float(d))
 
 
+# ======================================
+#   DISTANCIAS L2 VECTORIZADAS (GEMM)
+# ======================================
+
+# Umbral relativo bajo el cual ||a||² + ||b||² − 2a·b pierde precisión
+# por cancelación; esos pares se recalculan con la diferencia directa.
+TOL_CANCELACION = {"float32": 1e-3, "float64": 1e-6}
+
+# Memoria máxima de las diferencias directas de la corrección (por lote)
+PRESUPUESTO_CORRECCION = 64 * 2**20
+
+
+def normas_cuadradas(M, precision="float64"):
+    """Devuelve ||fila||² de cada fila de M (vector de tamaño n)."""
+    M = np.asarray(M, dtype=precision)
+    return np.einsum("ij,ij->i", M, M)
+
+
+def media_columnas(*matrices):
+    """Media por columna (ignorando NaN) de las filas de todas las matrices."""
+    suma = sum(np.nansum(M, axis=0, dtype=np.float64) for M in matrices)
+    conteo = sum((~np.isnan(M)).sum(axis=0) for M in matrices)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return suma / conteo
+
+
+def centrar(M, precision="float64", centro=None):
+    """
+    Resta a cada columna su media (o `centro`). La distancia L2 no cambia
+    con una traslación común, pero las normas bajan a la escala de la
+    varianza: sin esto, en series no centradas (p. ej. temperaturas en K)
+    casi todos los pares caen en la corrección por cancelación.
+    """
+    M = np.asarray(M, dtype=precision)
+    if centro is None:
+        centro = media_columnas(M)
+    centro = np.where(np.isfinite(centro), centro, 0.0).astype(precision)
+    return M - centro
+
+
+def recalcular_pares(d2, A, B, ii, jj, presupuesto=PRESUPUESTO_CORRECCION):
+    """
+    d2[ii, jj] = ||A[ii] − B[jj]||² con la diferencia directa en float64,
+    por lotes de pares cuyo (lote, columnas) float64 cabe en `presupuesto`.
+    """
+    lote = max(1, int(presupuesto // (8 * max(1, A.shape[1]))))
+    for s in range(0, ii.size, lote):
+        a, b = ii[s:s + lote], jj[s:s + lote]
+        diff = A[a].astype(np.float64) - B[b].astype(np.float64)
+        d2[a, b] = np.einsum("ij,ij->i", diff, diff)
+
+
+def distancias_l2_bloque(A, B, sqA=None, sqB=None, precision="float64",
+                         tol=None):
+    """
+    Distancias L2 entre todas las filas de A y todas las filas de B.
+
+    Usa ||a||² + ||b||² − 2a·b con un solo producto matricial (BLAS).
+    Los pares cuya distancia cuadrada es pequeña respecto a las normas
+    (cancelación numérica) se recalculan con la diferencia directa en
+    float64, por lotes de memoria acotada.
+
+    Sin sqA/sqB, A y B se centran con una media común antes del producto.
+    Con sqA/sqB, deben ser las normas de A y B tal como llegan: quien las
+    precalcula debe centrar antes la matriz completa (ver centrar()).
+
+    precision: 'float64' (exacto) o 'float32' (más rápido, menos memoria).
+    """
+    if precision not in TOL_CANCELACION:
+        raise ValueError(f"Precisión no soportada: {precision}")
+    if tol is None:
+        tol = TOL_CANCELACION[precision]
+
+    A = np.asarray(A, dtype=precision)
+    B = np.asarray(B, dtype=precision)
+    if sqA is None or sqB is None:
+        centro = media_columnas(A, B)
+        A, B = centrar(A, precision, centro), centrar(B, precision, centro)
+        sqA, sqB = normas_cuadradas(A, precision), normas_cuadradas(B, precision)
+
+    escala = sqA[:, None] + sqB[None, :]
+    d2 = escala - 2.0 * (A @ B.T)
+    np.maximum(d2, 0.0, out=d2)
+
+    # --- corrección por cancelación cerca de cero ---
+    ii, jj = np.nonzero(d2 <= tol * escala)
+    if ii.size:
+        recalcular_pares(d2, A, B, ii, jj)
+
+    return np.sqrt(d2, out=d2)
+
+
+def similitud_bloque(A, B, sqA=None, sqB=None, precision="float64"):
+    """
+    Similitud 1/(1+d) entre filas de A y filas de B (float32).
+    Equivalente a aplicar distancia_a_similitud(distancia_l2(a, b)) par a par.
+    """
+    d = distancias_l2_bloque(A, B, sqA, sqB, precision=precision)
+    d += 1.0
+    return np.reciprocal(d, out=d).astype(np.float32)
+
+
 # ======================================
 #   COMPARACIÓN BATCH DE UN BLOQUE
 # ======================================
@@ -30,19 +136,93 @@ def distancia_a_similitud(d):
 def comparar_bloque(args):
     """
     Compara un bloque de filas A contra TODAS las filas B.
+    args: (A_block, B_full) o (A_block, B_full, precision)
+    """
+    A_block, B_full = args[0], args[1]
+    precision = args[2] if len(args) > 2 else "float64"
+    return similitud_bloque(A_block, B_full, precision=precision)
+
+
+def calcular_tiles(M, tiles, precision="float64", sq=None):
+    """
+    Calcula una lista de tiles sobre M. Devuelve lista de (tile, bloque).
+    sq: normas cuadradas de las filas de M, ya centrada; si faltan, M se
+        centra y se calculan una vez.
+    """
+    if sq is None:
+        M = centrar(M, precision)
+        sq = normas_cuadradas(M, precision)
+    resultados = []
+    for tile in tiles:
+        i0, i1, j0, j1 = tile
+        bloque = similitud_bloque(M[i0:i1], M[j0:j1], sq[i0:i1], sq[j0:j1],
+                                  precision=precision)
+        resultados.append((tile, bloque))
+    return resultados
+
+
+def comparar_tiles(args):
+    """
+    Calcula un grupo de tiles del triángulo superior.
+    args: (M, sq, tiles, precision)
+    Devuelve lista de (tile, bloque).
+    """
+    M, sq, tiles, precision = args
+    return calcular_tiles(M, tiles, precision, sq)
+
+
+def comparar_tiles_compartido(args):
+    """
+    Igual que comparar_tiles, pero M y sus normas se leen de la memoria
+    compartida del worker: la tarea sólo trae coordenadas.
+    args: (tiles, precision)
     """
-    A_block, B_full = args
-    nA = A_block.shape[0]
-    nB = B_full.shape[0]
+    tiles, precision = args
+    return calcular_tiles(matriz_worker(0), tiles, precision, matriz_worker(1))
 
-    resultado = np.zeros((nA, nB), dtype=np.float32)
 
-    for i in range(nA):
-        for j in range(nB):
-            d = distancia_l2(A_block[i], B_full[j])
-            resultado[i, j] = distancia_a_similitud(d)
+# ======================================
+#   EJECUCIÓN DE TILES EN UN POOL
+# ======================================
+
+MODOS_MEMORIA = ("copia",) + MODOS
+
 
-    return resultado
+def ejecutar_tiles(M, grupos, precision="float64", modo_memoria="shm"):
+    """
+    Ejecuta grupos de tiles en un Pool (un grupo por proceso) y va
+    devolviendo (tile, bloque) conforme terminan. M se centra por columna y
+    las normas cuadradas de las filas se calculan una sola vez y viajan
+    igual que M.
+
+    modo_memoria:
+      'copia'  : M viaja serializada en cada tarea (comportamiento anterior)
+      'shm'    : M se publica una vez en shared_memory
+      'memmap' : M se publica una vez como .npy con mmap
+    """
+    if modo_memoria not in MODOS_MEMORIA:
+        raise ValueError(f"modo_memoria no soportado: {modo_memoria}")
+
+    n_procs = max(1, len(grupos))
+    M = centrar(M, precision)
+    sq = normas_cuadradas(M, precision)
+
+    if modo_memoria == "copia":
+        with Pool(processes=n_procs) as pool:
+            for resultados in pool.imap_unordered(
+                comparar_tiles, [(M, sq, grupo, precision) for grupo in grupos]
+            ):
+                yield from resultados
+        return
+
+    with MatrizCompartida(M, modo=modo_memoria) as mc, \
+            MatrizCompartida(sq, modo=modo_memoria) as mc_sq:
+        with Pool(processes=n_procs, initializer=inicializar_worker,
+                  initargs=(mc.descriptor, mc_sq.descriptor)) as pool:
+            for resultados in pool.imap_unordered(
+                comparar_tiles_compartido, [(grupo, precision) for grupo in grupos]
+            ):
+                yield from resultados
 
 
 # ======================================
@@ -50,43 +230,35 @@ def comparar_bloque(args):
 # ======================================
 
 def construir_matriz_similitud_blocks(df_wide, lista_mun, block_size=300,
-                                      n_procs=4, use_parallel=True):
+                                      n_procs=4, use_parallel=True,
+                                      precision="float64", modo_memoria="shm"):
 
     N = len(lista_mun)
-    columnas = df_wide.shape[1]
 
     print(f"Construyendo matriz por bloques: {N}x{N}")
 
-    # Convertimos a matriz numpy completa
-    M = df_wide.to_numpy(dtype=float)
+    # Convertimos a matriz numpy completa (acepta DataFrame, array o memmap)
+    M = np.asarray(df_wide, dtype=precision)
 
     # Matriz de salida
     out = np.zeros((N, N), dtype=np.float32)
 
-    # Preparamos bloques
-    bloques = []
-    for i in range(0, N, block_size):
-        A = M[i:i + block_size]
-        bloques.append((i, A))
+    # Sólo tiles del triángulo superior; el inferior se refleja
+    tiles = generar_tiles(N, block_size)
+    print(f"Tiles (triángulo superior): {len(tiles)}")
 
     # Procesamiento
     if use_parallel:
         n_procs = min(n_procs, cpu_count())
-        print(f"Procesando en paralelo con {n_procs} procesos...")
+        print(f"Procesando en paralelo con {n_procs} procesos (memoria: {modo_memoria})...")
 
-        with Pool(processes=n_procs) as pool:
-            for (idxA, A_block), resultado in zip(
-                bloques,
-                pool.imap(comparar_bloque, [(A_block, M) for (_, A_block) in bloques])
-            ):
-                nA = A_block.shape[0]
-                out[idxA:idxA + nA, :] = resultado
+        grupos = repartir_tiles(tiles, n_procs)
+        for tile, bloque in ejecutar_tiles(M, grupos, precision, modo_memoria):
+            reflejar_tile(out, tile, bloque)
 
     else:
         print("Procesando en modo secuencial...")
-        for idxA, A_block in bloques:
-            resultado = comparar_bloque((A_block, M))
-            nA = A_block.shape[0]
-            out[idxA:idxA + nA, :] = resultado
+        for tile, bloque in calcular_tiles(M, tiles, precision):
+            reflejar_tile(out, tile, bloque)
 
     return lista_mun, out
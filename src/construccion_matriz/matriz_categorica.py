@@ -1,57 +1,121 @@
 import numpy as np
 from src.utils.helpers import normalizar_cvegeo, Progreso
+from src.utils.topk import topk_por_tiles
 from joblib import Parallel, delayed
 from src.analisis.analisis_categorico import comparar_edafologia, comparar_topoforma, unir_edafologia, limpiar_texto
 
 
-def construir_matriz_categorica(lista_cvegeo, edafologia, topoforma, n_jobs=-1, cada=50, etiqueta="Matriz cat."):
-    n = len(lista_cvegeo)
-    matriz = np.zeros((n, n))
+# ======================================================
+# SIMILITUD SÓLO ENTRE VALORES ÚNICOS
+# ======================================================
+def _filas_unicos(unicos, i0, i1, funcion):
+    """Filas i0..i1 del triángulo superior de la matriz de únicos."""
+    u = len(unicos)
+    filas = np.zeros((i1 - i0, u))
+    for a in range(i0, i1):
+        for b in range(a, u):
+            filas[a - i0, b] = funcion(unicos[a], unicos[b])
+    return i0, filas
+
+
+def matriz_unicos(unicos, funcion, n_jobs=1, bloque=256, progreso=None):
+    """
+    Matriz U×U de similitud entre los valores únicos (U << N).
+    Sólo se evalúa el triángulo superior; el inferior se refleja.
+    """
+    u = len(unicos)
+    S = np.zeros((u, u))
+    rangos = [(i, min(i + bloque, u)) for i in range(0, u, bloque)]
+
+    if n_jobs == 1 or len(rangos) == 1:
+        resultados = (_filas_unicos(unicos, i0, i1, funcion) for i0, i1 in rangos)
+    else:
+        resultados = Parallel(n_jobs=n_jobs, backend="loky")(
+            delayed(_filas_unicos)(unicos, i0, i1, funcion) for i0, i1 in rangos
+        )
+
+    for i0, filas in resultados:
+        S[i0:i0 + filas.shape[0]] = filas
+        if progreso is not None:
+            progreso.paso(i0 + filas.shape[0])
 
+    S = np.triu(S)
+    return S + np.triu(S, 1).T
+
+
+def codificar(valores):
+    """Devuelve (unicos, codigos) tal que unicos[codigos] == valores."""
+    unicos, codigos = np.unique(np.asarray(valores, dtype=object).astype(str),
+                                return_inverse=True)
+    return unicos.tolist(), codigos.ravel()
+
+
+# ======================================================
+# MATRIZ CATEGÓRICA
+# ======================================================
+def codigos_categoricos(lista_cvegeo, edafologia, topoforma, n_jobs=-1, cada=50, etiqueta="Matriz cat."):
+    """
+    Códigos (N, 2) [edafología, topoforma] de cada municipio y las tablas de
+    similitud entre valores únicos [S_eda, S_topo]: la similitud entre i y j
+    es (S_eda[cod_i, cod_j] + S_topo[cod_i, cod_j]) / 2.
+    """
     # --- PRE-INDEXAR LOS DATOS ---
     eda_dict = {cve: unir_edafologia(row) 
                 for cve, row in edafologia.set_index("CVEGEO").iterrows()}
     topo_dict = {cve: limpiar_texto(row["CLAVE"]) 
                  for cve, row in topoforma.set_index("CVEGEO").iterrows()}
 
-    # --- FUNCION DE COMPARACION PARA UN PAR ---
-    def sim_pair(i, j):
-        mun_i = lista_cvegeo[i]
-        mun_j = lista_cvegeo[j]
-
-        val1_eda = eda_dict.get(mun_i, "")
-        val2_eda = eda_dict.get(mun_j, "")
-        val1_topo = topo_dict.get(mun_i, "")
-        val2_topo = topo_dict.get(mun_j, "")
-
-        sim_eda = comparar_edafologia(val1_eda, val2_eda)
-        sim_topo = comparar_topoforma(val1_topo, val2_topo)
-        sim = (sim_eda + sim_topo) / 2
-        return i, j, sim
-
-    # --- PREPARAR BARRA DE PROGRESO ---
-    total_pairs = n * (n + 1) // 2
-    progreso = Progreso(total=total_pairs, cada=cada, etiqueta=etiqueta)
-    count = 0
-
-    # --- CALCULAR MATRIZ PARALLEL ---
-    def callback(result):
-        nonlocal count
-        i, j, sim = result
-        matriz[i, j] = sim
-        matriz[j, i] = sim
-        count += 1
-        if count % cada == 0:
-            progreso.paso(count)
-
-    # --- EJECUTAR JOBS ---
-    results = Parallel(n_jobs=n_jobs, backend="loky")(
-        delayed(sim_pair)(i, j) for i in range(n) for j in range(i, n)
+    # --- CODIFICAR CADA MUNICIPIO CON SU VALOR ÚNICO ---
+    eda_unicos, eda_cod = codificar([eda_dict.get(c, "") for c in lista_cvegeo])
+    topo_unicos, topo_cod = codificar([topo_dict.get(c, "") for c in lista_cvegeo])
+
+    print(f"[{etiqueta}] Únicos edafología: {len(eda_unicos)}, topoforma: {len(topo_unicos)} (N={len(lista_cvegeo)})")
+
+    # --- SIMILITUD ENTRE ÚNICOS ---
+    S_eda = matriz_unicos(
+        eda_unicos, comparar_edafologia, n_jobs=n_jobs,
+        progreso=Progreso(total=len(eda_unicos), cada=cada, etiqueta=f"{etiqueta} eda")
+    )
+    S_topo = matriz_unicos(
+        topo_unicos, comparar_topoforma, n_jobs=n_jobs,
+        progreso=Progreso(total=len(topo_unicos), cada=cada, etiqueta=f"{etiqueta} topo")
     )
 
-    # --- RECONSTRUIR MATRIZ Y BARRA PROGRESO ---
-    for res in results:
-        callback(res)
+    return np.column_stack([eda_cod, topo_cod]), [S_eda, S_topo]
 
-    return matriz
 
+def construir_matriz_categorica(lista_cvegeo, edafologia, topoforma, n_jobs=-1, cada=50, etiqueta="Matriz cat.",
+                                bloque_filas=512, topk=None):
+    """
+    Construye la matriz de similitud categórica entre municipios.
+
+    La similitud se calcula sólo entre textos únicos de edafología y de
+    topoforma; la matriz N×N se arma por indexación con los códigos enteros
+    de cada municipio, en bloques de `bloque_filas` filas.
+
+    topk: si se da, en lugar de la matriz devuelve (vecinos, pesos) (N, topk)
+    calculados por tiles de `bloque_filas`; la matriz N×N no se construye.
+    """
+    n = len(lista_cvegeo)
+
+    codigos, (S_eda, S_topo) = codigos_categoricos(lista_cvegeo, edafologia, topoforma,
+                                                   n_jobs=n_jobs, cada=cada, etiqueta=etiqueta)
+    eda_cod, topo_cod = codigos[:, 0], codigos[:, 1]
+
+    if topk is not None:
+        return topk_por_tiles(
+            n, topk,
+            lambda i0, i1, j0, j1: (S_eda[np.ix_(eda_cod[i0:i1], eda_cod[j0:j1])] +
+                                    S_topo[np.ix_(topo_cod[i0:i1], topo_cod[j0:j1])]) / 2,
+            tile_size=bloque_filas, dtype=np.float64
+        )
+
+    matriz = np.zeros((n, n))
+
+    # --- EXPANDIR A N×N POR INDEXACIÓN ---
+    for i0 in range(0, n, bloque_filas):
+        i1 = min(i0 + bloque_filas, n)
+        matriz[i0:i1] = (S_eda[np.ix_(eda_cod[i0:i1], eda_cod)] +
+                         S_topo[np.ix_(topo_cod[i0:i1], topo_cod)]) / 2
+
+    return matriz
@@ -12,9 +12,13 @@ CONFIGURA:
     RUTA_SALIDA
 """
 
+import os
 import h5py
 import pandas as pd
 import numpy as np
+from src.utils.escritor_h5 import opciones_compresion
+from src.utils.topk import topk_bloque
+from src.utils.grafo import guardar_knn
 
 
 # ------------------------------------------------------------
@@ -86,7 +90,110 @@ def guardar_h5(df, path_salida):
 
 
 # ------------------------------------------------------------
-# 5. MAIN
+# 5. Versión en streaming (por bloques de filas)
+# ------------------------------------------------------------
+
+def leer_cvegeo(f):
+    """Lista de cvegeo (str) de un archivo H5 ya abierto."""
+    return [c.decode("utf-8") if isinstance(c, bytes) else str(c) for c in f["cvegeo"][:]]
+
+
+def indices_alineacion(cvegeo, orden):
+    """
+    Permutación entera `perm` tal que cvegeo[perm[k]] == orden[k].
+    """
+    posicion = {c: i for i, c in enumerate(cvegeo)}
+    faltantes = [c for c in orden if c not in posicion]
+    if faltantes:
+        raise ValueError(f"Faltan {len(faltantes)} municipios en la matriz (ej. {faltantes[:3]})")
+    return np.array([posicion[c] for c in orden], dtype=np.int64)
+
+
+def leer_bloque_alineado(dset, perm, r0, r1, identidad=False):
+    """
+    Lee las filas perm[r0:r1] de `dset` con columnas reordenadas según perm.
+    Si las filas son consecutivas se lee un slice contiguo.
+    """
+    filas = perm[r0:r1]
+    if identidad or np.all(np.diff(filas) == 1):
+        bloque = dset[filas[0]:filas[-1] + 1, :]
+    else:
+        # h5py exige índices crecientes: leer ordenado y reordenar en memoria
+        orden_lectura = np.argsort(filas)
+        bloque = np.empty((filas.size, dset.shape[1]), dtype=dset.dtype)
+        bloque[orden_lectura] = dset[filas[orden_lectura], :]
+
+    if identidad:
+        return bloque
+    return bloque[:, perm]
+
+
+def construir_matriz_general_streaming(archivos, pesos, ruta_salida, bloque_filas=256,
+                                       dtype="float64", compresion="none", nivel=4,
+                                       topk=None, ruta_knn=None):
+    """
+    Promedio ponderado de varias matrices H5 sin cargarlas completas.
+
+    Lee bloques de filas alineados de todos los archivos a la vez, aplica
+    los pesos y escribe cada bloque directo en el archivo de salida.
+    El orden de municipios es el del primer archivo; los demás se alinean
+    con índices enteros. Memoria pico: O(bloque_filas × N).
+
+    topk: si se da, la matriz general no se escribe; de cada bloque se toman
+    los topk vecinos por fila y se guarda el formato .npy de grafo.py en
+    ruta_knn (por defecto <ruta_salida sin extensión>_knn).
+    """
+    assert len(archivos) == len(pesos), "Debe haber un peso por matriz."
+
+    # Asegurar suma 1
+    suma = sum(pesos)
+    pesos = [p / suma for p in pesos]
+
+    fuentes = [h5py.File(p, "r") for p in archivos]
+    try:
+        orden = leer_cvegeo(fuentes[0])
+        n = len(orden)
+        perms = [indices_alineacion(leer_cvegeo(f), orden) for f in fuentes]
+        identidades = [np.array_equal(p, np.arange(n)) for p in perms]
+
+        def bloques():
+            for r0 in range(0, n, bloque_filas):
+                r1 = min(r0 + bloque_filas, n)
+                acumulado = np.zeros((r1 - r0, n), dtype=np.float64)
+                for f, perm, ident, w in zip(fuentes, perms, identidades, pesos):
+                    acumulado += w * leer_bloque_alineado(f["matriz"], perm, r0, r1, ident)
+                yield r0, r1, acumulado
+
+        if topk is not None:
+            vecinos, valores = [], []
+            for r0, r1, acumulado in bloques():
+                idx, w = topk_bloque(acumulado.astype(dtype), topk, fila_inicial=r0)
+                vecinos.append(idx)
+                valores.append(w)
+            ruta_knn = ruta_knn or os.path.splitext(ruta_salida)[0] + "_knn"
+            guardar_knn(ruta_knn, orden, np.vstack(vecinos), np.vstack(valores))
+            return ruta_knn
+
+        with h5py.File(ruta_salida, "w") as f_out:
+            f_out.create_dataset("cvegeo", data=np.array(orden, dtype="S5"))
+            # sin compresión se deja contiguo para poder abrirlo con mmap
+            opciones = opciones_compresion(compresion, nivel)
+            if opciones and n:
+                opciones["chunks"] = (min(bloque_filas, n), n)
+            d_out = f_out.create_dataset("matriz", shape=(n, n), dtype=dtype, **opciones)
+
+            for r0, r1, acumulado in bloques():
+                d_out[r0:r1, :] = acumulado
+    finally:
+        for f in fuentes:
+            f.close()
+
+    print(f"[OK] Matriz guardada en: {ruta_salida}")
+    return ruta_salida
+
+
+# ------------------------------------------------------------
+# 6. MAIN
 # ------------------------------------------------------------
 
 if __name__ == "__main__":
@@ -104,18 +211,7 @@ if __name__ == "__main__":
     RUTA_SALIDA = "outputs/matriz_sim_general.h5"
     # ===========================================================
 
-    print("[INFO] Cargando matrices...")
-
-    matrices = [cargar_matriz(p) for p in ARCHIVOS_MATRICES]
-
-    # Asegurar mismo orden
-    orden = matrices[0].index.tolist()
-    matrices = [alinear_matriz(df, orden) for df in matrices]
-
-    print("[INFO] Construyendo matriz general...")
-    matriz_general = construir_matriz_general(matrices, PESOS)
-
-    print("[INFO] Guardando archivo...")
-    guardar_h5(matriz_general, RUTA_SALIDA)
+    print("[INFO] Construyendo matriz general por bloques...")
+    construir_matriz_general_streaming(ARCHIVOS_MATRICES, PESOS, RUTA_SALIDA)
 
     print("[DONE] Matriz general construida exitosamente.")
@@ -2,14 +2,19 @@ import os
 import numpy as np
 import pandas as pd
 import h5py
-from math import ceil
-from multiprocessing import Pool, cpu_count
+from multiprocessing import cpu_count
 from sklearn.preprocessing import MinMaxScaler
+from src.construccion_matriz.matriz_blocks import ejecutar_tiles
+from src.utils.planificador import generar_tiles, repartir_tiles
+from src.utils.escritor_h5 import EscritorTilesH5
+from src.utils.almacen_series import PERIODOS, obtener_almacen
+from src.utils.topk import AcumuladorTopK
+from src.utils.grafo import guardar_knn
 
 # -------------------------------------------------------
 # helper: pivotar si el DF está en formato largo (CVEGEO, valid_time, value)
 # -------------------------------------------------------
-def pivot_if_long(df):
+def pivot_if_long(df, periodo="mes"):
     # si tiene columna 'valid_time' (o tipo datetime) y más de 2 columnas -> es formato largo
     cols = set(df.columns.str.lower())
     if "valid_time" in df.columns or "valid_time" in cols:
@@ -21,8 +26,8 @@ def pivot_if_long(df):
         # crear columna mes (YYYY_MM) si es mensual (o fecha si ya lo es)
         df["valid_time"] = pd.to_datetime(df["valid_time"], errors="coerce")
         # si el dataset tiene hora, convertimos a fecha (diario) o a mes si queremos mensual
-        # aquí asumimos que para matrices mensuales queremos agrupar por mes -> YYYY_MM
-        df["mes"] = df["valid_time"].dt.to_period("M").astype(str)
+        # agrupar por periodo: 'mes' -> YYYY-MM, 'dia' -> YYYY-MM-DD
+        df["mes"] = df["valid_time"].dt.to_period(PERIODOS[periodo]).astype(str)
         pivot = df.pivot_table(index="CVEGEO", columns="mes", values=val_col, aggfunc="mean")
         # devolver pivot como dataframe con columnas ordenadas cronológicamente
         pivot = pivot.reindex(sorted(pivot.columns), axis=1).reset_index()
@@ -31,51 +36,55 @@ def pivot_if_long(df):
         # si ya está ancho (CVEGEO + columnas mes), devolver tal cual
         return df
 
-# ======================================================
-# FUNCIÓN QUE CALCULA UN BLOQUE DEL TRIÁNGULO SUPERIOR
-# ======================================================
-def calcular_bloque(args):
-    data, start_i, end_i = args
-    n = data.shape[0]
-
-    bloque = []
-    for i in range(start_i, end_i):
-        fila = np.zeros(n, dtype=np.float32)
-        vi = data[i]
-        # calcular j desde i hasta n-1
-        for j in range(i, n):
-            dist = np.linalg.norm(vi - data[j])
-            fila[j] = 1.0 / (1.0 + dist)   # similitud 1/(1+d)
-        bloque.append((i, fila))
-    return bloque
-
 # ======================================================
 # FUNCIÓN GENERAL PARA CONSTRUIR MATRIZ OPTIMIZADA (AHORA ROBUSTA)
 # ======================================================
-def construir_matriz_optimizada(path_parquet, salida_h5, normalizar=False, modo="mensual"):
+def construir_matriz_optimizada(path_parquet, salida_h5, normalizar=False, modo="mensual",
+                                tile_size=256, precision="float64", modo_memoria="shm",
+                                compresion="gzip", nivel_compresion=4, ruta_almacen=None,
+                                topk=None, ruta_knn=None, periodo="mes"):
     """
     path_parquet: ruta a parquet que puede estar en formato ancho (CVEGEO + meses) o largo (CVEGEO, valid_time, value).
     salida_h5: ruta de salida .h5
     normalizar: aplicar MinMax por columna (meses)
     modo: 'mensual' (por defecto) - usado para decidir agrupación al pivotar
+    tile_size: lado de los tiles del triángulo superior
+    precision: 'float64' o 'float32' para el cálculo de distancias
+    modo_memoria: 'shm' / 'memmap' (X se publica una vez) o 'copia' (X viaja en cada tarea)
+    compresion: 'gzip' (con nivel_compresion), 'lzf' o 'none'; los chunks = tile_size
+    ruta_almacen: si se da, las series se leen (mmap) del almacén pre-pivotado en
+                  esa ruta, que se construye sólo si falta o cambió la fuente
+    topk: si se da, no se escribe la matriz N×N: los tiles se fusionan en un
+          top-k por fila y se guarda el formato .npy de grafo.py en ruta_knn
+          (por defecto <salida_h5 sin extensión>_knn)
+    periodo: agregación temporal de un parquet largo, 'mes' o 'dia'
+             (con o sin almacén)
     """
+    if periodo not in PERIODOS:
+        raise ValueError(f"Periodo no soportado: {periodo}. Usa uno de {tuple(PERIODOS)}")
+
     # crear carpeta de salida si no existe
     os.makedirs(os.path.dirname(salida_h5) or ".", exist_ok=True)
 
-    df = pd.read_parquet(path_parquet)
+    if ruta_almacen is not None:
+        almacen = obtener_almacen(path_parquet, ruta_almacen, periodo=periodo)
+        municipios = np.asarray(almacen.cvegeo)
+        values = almacen.valores
+    else:
+        df = pd.read_parquet(path_parquet)
 
-    # si viene en formato largo, pivotar a ancho
-    df = pivot_if_long(df)
+        # si viene en formato largo, pivotar a ancho
+        df = pivot_if_long(df, periodo)
 
-    # asegurar que CVEGEO exista y esté ordenado
-    if "CVEGEO" not in df.columns:
-        raise ValueError("Después del pivot falta columna 'CVEGEO'")
+        # asegurar que CVEGEO exista y esté ordenado
+        if "CVEGEO" not in df.columns:
+            raise ValueError("Después del pivot falta columna 'CVEGEO'")
 
-    df = df.sort_values("CVEGEO").reset_index(drop=True)
+        df = df.sort_values("CVEGEO").reset_index(drop=True)
 
-    municipios = df["CVEGEO"].astype(str).to_numpy()
-    # quitar la columna CVEGEO y convertir a numpy (valores float)
-    values = df.drop(columns=["CVEGEO"]).to_numpy(dtype=np.float32)
+        municipios = df["CVEGEO"].astype(str).to_numpy()
+        # quitar la columna CVEGEO y convertir a numpy (valores float)
+        values = df.drop(columns=["CVEGEO"]).to_numpy(dtype=np.float32)
 
     print("\n=== Construcción optimizada ===")
     print(f"Municipios: {values.shape[0]}, Meses: {values.shape[1]}")
@@ -89,40 +98,40 @@ def construir_matriz_optimizada(path_parquet, salida_h5, normalizar=False, modo=
 
     n = X.shape[0]
 
+    # paralelizar por tiles del triángulo superior, balanceados por costo
+    num_workers = max(1, cpu_count() - 1)
+    tiles = generar_tiles(n, tile_size)
+    grupos = repartir_tiles(tiles, num_workers)
+
+    print(f"Usando {len(grupos)} procesos, tiles: {len(tiles)} de {tile_size}, memoria: {modo_memoria}")
+
+    if topk is not None:
+        # top-k acumulado tile por tile: memoria O(N·k), sin matriz en disco
+        acumulador = AcumuladorTopK(n, topk)
+        for tile, bloque in ejecutar_tiles(X, grupos, precision, modo_memoria):
+            acumulador.agregar_tile(tile, bloque)
+        vecinos, pesos = acumulador.resultado()
+
+        ruta_knn = ruta_knn or os.path.splitext(salida_h5)[0] + "_knn"
+        guardar_knn(ruta_knn, municipios, vecinos, pesos)
+        print("OK ✔️\n")
+        return ruta_knn
+
     # Crear archivo HDF5 y dataset
     with h5py.File(salida_h5, "w") as h5:
-        d_matriz = h5.create_dataset(
-            "matriz",
-            shape=(n, n),
+        # chunks alineados a los tiles: cada tile se escribe como chunk completo
+        escritor = EscritorTilesH5(
+            h5, "matriz", n, tile_size,
             dtype=np.float32,
-            compression="gzip"
+            compresion=compresion,
+            nivel=nivel_compresion
         )
         # guardar cvegeo como bytes fixed-length
         h5.create_dataset("cvegeo", data=municipios.astype("S5"), compression="gzip")
 
-        # paralelizar por bloques
-        num_workers = max(1, min(cpu_count() - 1,  max(1, n)))  # no pedir > n
-        bloque_tamano = ceil(n / max(1, num_workers))
-
-        print(f"Usando {num_workers} procesos, bloque: {bloque_tamano}")
-
-        argumentos = []
-        for k in range(num_workers):
-            i0 = k * bloque_tamano
-            i1 = min((k + 1) * bloque_tamano, n)
-            if i0 >= i1:
-                continue
-            argumentos.append((X, i0, i1))
-
-        # pool de procesos
-        with Pool(num_workers) as pool:
-            for bloque in pool.imap(calcular_bloque, argumentos):
-                for (i, fila_sup) in bloque:
-                    # longitud del triángulo en esta fila
-                    long = n - i
-                    # fila_sup tiene tamaño n, pero solo nos interesan las posiciones i..n-1
-                    d_matriz[i, i:i+long] = fila_sup[i:i+long]
-                    d_matriz[i:i+long, i] = fila_sup[i:i+long]  # reflejo
+        # pool de procesos: los workers sólo reciben coordenadas de tiles
+        for tile, bloque in ejecutar_tiles(X, grupos, precision, modo_memoria):
+            escritor.escribir_tile(tile, bloque)
 
     print(f"Matriz guardada en: {salida_h5}")
     print("OK ✔️\n")
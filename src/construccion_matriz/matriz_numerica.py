@@ -1,15 +1,13 @@
 import numpy as np
-from joblib import Parallel, delayed
 from src.utils.helpers import normalizar_cvegeo, Progreso
-from src.analisis.analisis_numerico import similitud_proporcional, rango_a_promedio, similitud_proporcional
+from src.analisis.analisis_numerico import similitud_proporcional_matriz, rango_a_promedio
+from src.utils.topk import topk_por_tiles
 
-def construir_matriz_numerica(lista_cvegeo, precipitacion, temperatura, unidades_climaticas, n_jobs=-1, cada=50, etiqueta="Matriz num."):
+def vectores_numericos(lista_cvegeo, precipitacion, temperatura, unidades_climaticas):
     """
-    Construye la matriz de similitud numérica entre municipios.
+    Matriz (N, 3) [precipitación, temperatura, unidad climática] alineada a
+    lista_cvegeo (0.0 si el municipio no tiene dato).
     """
-    n = len(lista_cvegeo)
-    matriz = np.zeros((n, n))
-
     # --- PRE-INDEXAR Y PREPROCESAR LOS DATOS ---
     prec_dict = {cve: rango_a_promedio(fila["RANGOS"]) 
                  for cve, fila in precipitacion.set_index("CVEGEO").iterrows()}
@@ -17,40 +15,52 @@ def construir_matriz_numerica(lista_cvegeo, precipitacion, temperatura, unidades
                  for cve, fila in temperatura.set_index("CVEGEO").iterrows()}
     uni_dict = {cve: fila["TIPO_N"] for cve, fila in unidades_climaticas.set_index("CVEGEO").iterrows()}
 
-    # --- FUNCION DE COMPARACION PARA UN PAR ---
-    def sim_pair(i, j):
-        mun_i = lista_cvegeo[i]
-        mun_j = lista_cvegeo[j]
+    # --- VECTORES ALINEADOS A lista_cvegeo ---
+    return np.column_stack([
+        np.array([prec_dict.get(c, 0.0) for c in lista_cvegeo], dtype=np.float64),
+        np.array([temp_dict.get(c, 0.0) for c in lista_cvegeo], dtype=np.float64),
+        np.array([uni_dict.get(c, 0.0) for c in lista_cvegeo], dtype=np.float64),
+    ])
+
+
+def construir_matriz_numerica(lista_cvegeo, precipitacion, temperatura, unidades_climaticas, n_jobs=-1, cada=50, etiqueta="Matriz num.",
+                              bloque_filas=512, topk=None):
+    """
+    Construye la matriz de similitud numérica entre municipios.
+
+    Se calcula en bloques de `bloque_filas` filas con similitud_proporcional
+    vectorizada, así la memoria queda acotada a O(bloque × N).
+    n_jobs se conserva por compatibilidad; ya no se usa un pool de procesos.
+
+    topk: si se da, en lugar de la matriz devuelve (vecinos, pesos) (N, topk)
+    calculados por tiles de `bloque_filas`; la matriz N×N no se construye.
+    """
+    n = len(lista_cvegeo)
+
+    prec, temp, uni = vectores_numericos(lista_cvegeo, precipitacion, temperatura, unidades_climaticas).T
 
-        sim_prec = similitud_proporcional(prec_dict.get(mun_i, 0.0), prec_dict.get(mun_j, 0.0))
-        sim_temp = similitud_proporcional(temp_dict.get(mun_i, 0.0), temp_dict.get(mun_j, 0.0))
-        sim_uni  = similitud_proporcional(uni_dict.get(mun_i, 0.0), uni_dict.get(mun_j, 0.0))
+    if topk is not None:
+        return topk_por_tiles(
+            n, topk,
+            lambda i0, i1, j0, j1: (similitud_proporcional_matriz(prec[i0:i1], prec[j0:j1]) +
+                                    similitud_proporcional_matriz(temp[i0:i1], temp[j0:j1]) +
+                                    similitud_proporcional_matriz(uni[i0:i1], uni[j0:j1])) / 3,
+            tile_size=bloque_filas, dtype=np.float64
+        )
 
-        sim_final = (sim_prec + sim_temp + sim_uni) / 3
-        return i, j, sim_final
+    matriz = np.zeros((n, n))
 
     # --- BARRA DE PROGRESO ---
-    total_pairs = n * (n + 1) // 2
-    progreso = Progreso(total=total_pairs, cada=cada, etiqueta=etiqueta)
-    count = 0
-
-    # --- CALLBACK PARA ACTUALIZAR MATRIZ Y BARRA ---
-    def callback(result):
-        nonlocal count
-        i, j, sim = result
-        matriz[i, j] = sim
-        matriz[j, i] = sim
-        count += 1
-        if count % cada == 0:
-            progreso.paso(count)
-
-    # --- PARALLEL COMPUTATION ---
-    results = Parallel(n_jobs=n_jobs, backend="loky")(
-        delayed(sim_pair)(i, j) for i in range(n) for j in range(i, n)
-    )
-
-    for res in results:
-        callback(res)
+    progreso = Progreso(total=n, cada=cada, etiqueta=etiqueta)
 
-    return matriz
+    # --- CÁLCULO POR BLOQUES DE FILAS ---
+    for i0 in range(0, n, bloque_filas):
+        i1 = min(i0 + bloque_filas, n)
+        matriz[i0:i1] = (
+            similitud_proporcional_matriz(prec[i0:i1], prec) +
+            similitud_proporcional_matriz(temp[i0:i1], temp) +
+            similitud_proporcional_matriz(uni[i0:i1], uni)
+        ) / 3
+        progreso.paso(i1)
 
+    return matriz
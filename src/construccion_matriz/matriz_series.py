@@ -1,8 +1,7 @@
 import numpy as np
 import pandas as pd
-from concurrent.futures import ProcessPoolExecutor
-from itertools import combinations
-from functools import partial
+from src.utils.planificador import generar_tiles, reflejar_tile
+from src.utils.almacen_series import AlmacenSeries
 
 
 def similitud_series(seriesA, seriesB):
@@ -15,34 +14,57 @@ def similitud_series(seriesA, seriesB):
     return float(corr)
 
 
-def tarea_comparacion(args):
-    """Desempaqueta los argumentos. Compatible con ProcessPoolExecutor."""
-    cveA, cveB, series_dict = args
-    return cveA, cveB, similitud_series(series_dict[cveA], series_dict[cveB])
+def estandarizar_series(X):
+    """
+    Centra cada fila y la escala a norma 1, de modo que Z @ Z.T es la
+    matriz de correlación de Pearson.
 
+    Las filas con algún NaN o varianza cero quedan en 0: su correlación
+    con cualquier otra es 0, igual que en similitud_series.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    validas = ~np.isnan(X).any(axis=1)
 
-def construir_matriz_similitud(df):
-    cves = df["CVEGEO"].tolist()
-    series_dict = {
-        cve: df.loc[df["CVEGEO"] == cve].iloc[:, 1:].values.flatten()
-        for cve in cves
-    }
+    Z = np.zeros_like(X)
+    Xv = X[validas]
+    Xv = Xv - Xv.mean(axis=1, keepdims=True)
+    norma = np.sqrt(np.einsum("ij,ij->i", Xv, Xv))
+    constantes = norma == 0
+    norma[constantes] = 1.0
+    Xv /= norma[:, None]
+    Xv[constantes] = 0.0
+    Z[validas] = Xv
+    return Z
 
-    n = len(cves)
-    matriz = np.zeros((n, n), dtype=np.float32)
 
-    pares = [(i, j) for i, j in combinations(range(n), 2)]
-    args = [(cves[i], cves[j], series_dict) for i, j in pares]
+def construir_matriz_similitud(series, tile_size=512):
+    """
+    Matriz de correlación de Pearson entre las series (una fila por CVEGEO).
+
+    series: AlmacenSeries (se lee del mmap, sin pivotar de nuevo) o
+    DataFrame ancho con CVEGEO en la primera columna.
 
-    print(f"Comparaciones totales: {len(args):,}")
+    Las series se estandarizan una sola vez y la correlación se calcula como
+    producto matricial por tiles del triángulo superior, así la memoria
+    extra por tile es O(tile²). La diagonal queda en 0, como antes.
+    """
+    if isinstance(series, AlmacenSeries):
+        cves = list(series.cvegeo)
+        Z = estandarizar_series(series.valores)
+    else:
+        cves = series["CVEGEO"].tolist()
+        Z = estandarizar_series(series.iloc[:, 1:].to_numpy(dtype=np.float64))
+
+    n = len(cves)
+    matriz = np.zeros((n, n), dtype=np.float32)
 
-    with ProcessPoolExecutor() as executor:
-        for idx, (cveA, cveB, sim) in enumerate(executor.map(tarea_comparacion, args)):
-            i = cves.index(cveA)
-            j = cves.index(cveB)
-            matriz[i, j] = matriz[j, i] = sim
+    tiles = generar_tiles(n, tile_size)
+    print(f"Comparaciones totales: {n * (n - 1) // 2:,} en {len(tiles)} tiles")
 
-            if idx % 50_000 == 0 and idx > 0:
-                print(f"  {idx:,} comparaciones...")
+    for tile in tiles:
+        i0, i1, j0, j1 = tile
+        bloque = np.clip(Z[i0:i1] @ Z[j0:j1].T, -1.0, 1.0)
+        reflejar_tile(matriz, tile, bloque)
 
+    np.fill_diagonal(matriz, 0.0)
     return cves, matriz
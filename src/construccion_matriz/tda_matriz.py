@@ -1,59 +1,99 @@
 # src/tda/tda_matriz.py
+"""
+Matriz de distancias TDA (sliced-Wasserstein) entre municipios.
+
+Los diagramas se leen de la caché (tda_cache), se proyectan una sola vez
+sobre direcciones fijas y las distancias se calculan por tiles del
+triángulo superior, escribiendo cada tile (y su transpuesta) en el H5.
+"""
 import os
 import numpy as np
 import h5py
 from joblib import Parallel, delayed
-from src.utils.tda_utils import (
-    normalizar_serie,
-    takens_embedding,
-    obtener_diagrama,
-    distancia_tda, distancia_diagramas
-)
-from math import ceil
 from multiprocessing import cpu_count
-from src.utils.tda_utils import distancia_diagramas  # función que calcula dist entre dos diagramas
+from src.utils.tda_cache import cargar_diagramas, lista_diagramas
+from src.utils.planificador import generar_tiles, repartir_tiles
+from src.utils.escritor_h5 import EscritorTilesH5
+from src.utils.sliced_wasserstein import (
+    N_DIRECCIONES,
+    proyectar_diagramas,
+    proyectar_rellenas,
+    vectores_malla,
+    sw_bloque_malla,
+    sw_bloque_exacto
+)
+
+METODOS = ("exacto", "malla")
+
+
+def calcular_tiles_sw(datos, tiles, metodo="exacto", orden=2):
+    """Calcula una lista de tiles; `datos` son proyecciones rellenas o vectores de malla."""
+    if metodo == "malla":
+        return [(t, sw_bloque_malla(datos, t, orden)) for t in tiles]
+    return [(t, sw_bloque_exacto(datos, t, orden)) for t in tiles]
+
+
+def matriz_sw(diagramas, salida_h5, cves, n_jobs=None, block_size=256, metodo="exacto",
+              n_direcciones=N_DIRECCIONES, n_malla=100, orden=2, compresion="gzip", nivel=4):
+    """
+    Escribe en `salida_h5` el dataset 'distancias' (N×N float32) y 'cvegeo'.
+
+    metodo="exacto": W1 entre proyecciones aumentadas, vectorizada por bloques de pares.
+    metodo="malla":  aproximación opcional; L1 entre vectores fijos por diagrama.
+    n_direcciones: 100 por defecto, como PairwiseDistance de giotto-tda.
+
+    Las proyecciones rellenas (exacto) se guardan en float32 y sin copia
+    sin rellenar: memoria ~ 2 · 4 · N · n_direcciones · k_max por dimensión.
+    """
+    if metodo not in METODOS:
+        raise ValueError(f"Método no soportado: {metodo}. Usa uno de {METODOS}")
 
-def construir_matriz_tda_from_cache(cache_h5, salida_h5, n_jobs=None, block_size=200):
-    with h5py.File(cache_h5, "r") as f:
-        cves = [c.decode() if isinstance(c, bytes) else c for c in f["cvegeo"][:]]
-        grp = f["diagramas"]
+    n = len(diagramas)
+    if n_jobs is None:
+        n_jobs = max(1, cpu_count() - 1)
 
-        # cargar diagramas en memoria (lista) -- si pesan mucho, se pueden procesar por bloques
-        diagramas = []
-        for c in cves:
-            raw = grp[c]
-            dgm = pickle.loads(raw[()])
-            diagramas.append(dgm)
+    if metodo == "malla":
+        proyecciones = proyectar_diagramas(diagramas, n_direcciones)
+        datos = vectores_malla(proyecciones, n_malla)
+        del proyecciones
+    else:
+        datos = proyectar_rellenas(diagramas, n_direcciones)
 
-    n = len(cves)
-    os.makedirs(os.path.dirname(salida_h5), exist_ok=True)
+    tiles = generar_tiles(n, block_size)
+    grupos = [g for g in repartir_tiles(tiles, n_jobs * 4) if g]
 
-    # Escribir en HDF5 por bloques
+    os.makedirs(os.path.dirname(salida_h5) or ".", exist_ok=True)
     with h5py.File(salida_h5, "w") as f_out:
-        dset = f_out.create_dataset("distancias", shape=(n, n), dtype=np.float32, compression="gzip")
-        f_out.create_dataset("cvegeo", data=np.array(cves, dtype='S5'))
+        escritor = EscritorTilesH5(f_out, "distancias", n, block_size, np.float32,
+                                   compresion, nivel)
+        f_out.create_dataset("cvegeo", data=np.array(cves, dtype="S5"))
+        f_out["distancias"].attrs["tipo"] = "distancia"
+        f_out["distancias"].attrs["metodo"] = metodo
+        f_out["distancias"].attrs["n_direcciones"] = n_direcciones
+        if metodo == "malla":
+            f_out["distancias"].attrs["n_malla"] = n_malla
 
-        if n_jobs is None:
-            n_jobs = max(1, cpu_count() - 1)
+        # hilos: las operaciones de NumPy liberan el GIL y los datos no se copian
+        resultados = Parallel(n_jobs=n_jobs, prefer="threads", return_as="generator")(
+            delayed(calcular_tiles_sw)(datos, grupo, metodo, orden) for grupo in grupos
+        )
+        for lote in resultados:
+            for tile, bloque in lote:
+                escritor.escribir_tile(tile, bloque)
 
-        def procesar_i(i):
-            fila = np.zeros(n, dtype=np.float32)
-            dgi = diagramas[i]
-            for j in range(i, n):
-                fila[j] = distancia_diagramas(dgi, diagramas[j])
-            return i, fila
+    return salida_h5
 
-        # Parallelizar por filas (o por bloques si n muy grande)
-        results = Parallel(n_jobs=n_jobs)(delayed(procesar_i)(i) for i in range(n))
 
-        for i, fila in results:
-            dset[i, i:] = fila[i:]
-            dset[i:, i] = fila[i:]
+def construir_matriz_tda_from_cache(cache_h5, salida_h5, n_jobs=None, block_size=256,
+                                    dim=3, delay=5, normalizacion="minmax", metodo="exacto",
+                                    n_direcciones=N_DIRECCIONES, n_malla=100, **opciones_vr):
+    # diagramas concatenados + offsets (sin pickle); cada diagrama es una vista
+    cves, puntos, offsets = cargar_diagramas(cache_h5, dim=dim, delay=delay,
+                                             normalizacion=normalizacion, **opciones_vr)
+    diagramas = lista_diagramas(puntos, offsets)
 
-        # --- Reflejo inferior ---
-        print("Reflejando matriz...")
-        for i in range(n):
-            for j in range(i + 1, n):
-                d_matriz[j, i] = d_matriz[i, j]
+    matriz_sw(diagramas, salida_h5, cves, n_jobs=n_jobs, block_size=block_size,
+              metodo=metodo, n_direcciones=n_direcciones, n_malla=n_malla)
 
     print(f"Matriz TDA guardada en: {salida_h5}")
+    return salida_h5
@@ -0,0 +1,131 @@
+# src/utils/almacen_series.py
+"""
+Almacén de series pre-pivotadas: un array denso float32
+(municipio × tiempo) por variable, con sus ejes CVEGEO y tiempo.
+
+Se guarda como un directorio de .npy y se abre con mmap:
+
+    valores.npy  (N, T) float32
+    cvegeo.npy   (N,)   S5
+    tiempos.npy  (T,)   etiquetas de tiempo (str)
+    meta.json    firma de la fuente y parámetros del pivot
+
+El pivot se hace una sola vez por versión del dataset (firma de la fuente);
+las series por municipio son vistas O(1) del array.
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from data.acceso_data import firma_fuente, normalizar_cvegeo_serie
+
+PERIODOS = {"mes": "M", "dia": "D"}
+
+
+# ======================================
+#   PIVOT LARGO → ANCHO
+# ======================================
+
+def pivotar_a_denso(df, id_col="CVEGEO", fecha_col="valid_time", var_col=None, periodo="mes"):
+    """
+    Devuelve un DataFrame ancho (index = CVEGEO ordenado, columnas = tiempo).
+
+    - Formato largo (tiene `fecha_col`): promedio por periodo ('mes' → YYYY-MM,
+      'dia' → YYYY-MM-DD), columnas en orden cronológico.
+    - Formato ancho (CVEGEO + columnas de tiempo): columnas en orden
+      lexicográfico (YYYY-MM queda cronológico).
+    """
+    if fecha_col in df.columns:
+        if var_col is None:
+            posibles = [c for c in df.columns if c not in (id_col, fecha_col)]
+            if not posibles:
+                raise ValueError("Formato largo detectado pero no hay columna de valor.")
+            var_col = posibles[0]
+        fechas = pd.to_datetime(df[fecha_col], errors="coerce")
+        etiqueta = fechas.dt.to_period(PERIODOS[periodo]).astype(str)
+        ancho = df.pivot_table(index=id_col, columns=etiqueta, values=var_col, aggfunc="mean")
+        ancho = ancho.reindex(sorted(ancho.columns), axis=1)
+    else:
+        ancho = df.loc[:, ~df.columns.astype(str).str.contains("^Unnamed")].set_index(id_col)
+        ancho = ancho.sort_index(axis=1)
+
+    ancho.index = normalizar_cvegeo_serie(pd.Series(ancho.index.astype(str))).to_numpy()
+    return ancho.sort_index()
+
+
+# ======================================
+#   CONSTRUIR / ABRIR
+# ======================================
+
+def construir_almacen(path_parquet, ruta_almacen, id_col="CVEGEO", fecha_col="valid_time",
+                      var_col=None, periodo="mes", relleno=None):
+    """
+    Pivota `path_parquet` y guarda el almacén en `ruta_almacen`.
+    relleno: None o 'ffill_bfill' (relleno horizontal de faltantes).
+    """
+    if relleno not in (None, "ffill_bfill"):
+        raise ValueError(f"Relleno no soportado: {relleno}")
+
+    df = pd.read_parquet(path_parquet)
+    ancho = pivotar_a_denso(df, id_col, fecha_col, var_col, periodo)
+    if relleno == "ffill_bfill":
+        ancho = ancho.ffill(axis=1).bfill(axis=1)
+
+    os.makedirs(ruta_almacen, exist_ok=True)
+    np.save(os.path.join(ruta_almacen, "valores.npy"), ancho.to_numpy(dtype=np.float32))
+    np.save(os.path.join(ruta_almacen, "cvegeo.npy"), np.asarray(ancho.index, dtype="S5"))
+    np.save(os.path.join(ruta_almacen, "tiempos.npy"), np.array([str(t) for t in ancho.columns], dtype="U"))
+
+    meta = {
+        "fuente": path_parquet,
+        "firma": firma_fuente(path_parquet),
+        "parametros": [id_col, fecha_col, var_col, periodo, relleno],
+    }
+    with open(os.path.join(ruta_almacen, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"[OK] Almacén de series guardado en: {ruta_almacen} {ancho.shape}")
+    return AlmacenSeries(ruta_almacen)
+
+
+def obtener_almacen(path_parquet, ruta_almacen, id_col="CVEGEO", fecha_col="valid_time",
+                    var_col=None, periodo="mes", relleno=None):
+    """
+    Abre el almacén si corresponde a la versión actual de la fuente (misma
+    firma y parámetros); si no, lo (re)construye.
+    """
+    parametros = [id_col, fecha_col, var_col, periodo, relleno]
+    ruta_meta = os.path.join(ruta_almacen, "meta.json")
+    if os.path.exists(ruta_meta):
+        with open(ruta_meta) as f:
+            meta = json.load(f)
+        if meta.get("firma") == firma_fuente(path_parquet) and meta.get("parametros") == parametros:
+            return AlmacenSeries(ruta_almacen)
+
+    return construir_almacen(path_parquet, ruta_almacen, *parametros)
+
+
+class AlmacenSeries:
+    """
+    Vista de sólo lectura (mmap) de un almacén de series.
+    serie(cve) devuelve una vista O(1) de la fila del municipio.
+    """
+
+    def __init__(self, ruta_almacen):
+        self.ruta = ruta_almacen
+        self.valores = np.load(os.path.join(ruta_almacen, "valores.npy"), mmap_mode="r")
+        self.cvegeo = [c.decode("utf-8") for c in np.load(os.path.join(ruta_almacen, "cvegeo.npy"))]
+        self.tiempos = np.load(os.path.join(ruta_almacen, "tiempos.npy"))
+        self.posicion = {c: i for i, c in enumerate(self.cvegeo)}
+
+    @property
+    def shape(self):
+        return self.valores.shape
+
+    def serie(self, cvegeo):
+        return self.valores[self.posicion[cvegeo]]
+
+    def como_dataframe(self):
+        """DataFrame ancho (index = CVEGEO, columnas = tiempos); copia los datos."""
+        return pd.DataFrame(np.asarray(self.valores), index=self.cvegeo, columns=self.tiempos)
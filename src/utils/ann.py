@@ -0,0 +1,327 @@
+# src/utils/ann.py
+"""
+Vecinos más cercanos aproximados (k-NN) sin construir la matriz N×N.
+
+- Inicialización con un bosque de árboles de proyección aleatoria (RP):
+  cada hoja aporta sus pares como candidatos.
+- Refinamiento con NN-descent: los vecinos de los vecinos (incluyendo
+  vecinos inversos) son candidatos; se repite hasta que casi no hay cambios.
+
+La similitud la define un "espacio" con dos piezas:
+  pares(i, j)  -> similitud entre los municipios i[t] y j[t] (arrays 1-D)
+  vectores     -> representación euclidiana para los árboles RP (o None)
+
+Los resultados tienen el mismo formato que topk.py / grafo.py:
+vecinos (N, k) int64 y pesos (N, k), ordenados de mayor a menor similitud.
+"""
+
+import numpy as np
+from src.analisis.analisis_numerico import similitud_proporcional_pares
+from src.construccion_matriz.matriz_blocks import (
+    centrar, distancias_l2_bloque, normas_cuadradas
+)
+from src.utils.topk import topk_bloque
+
+# Memoria máxima por bloque de pares evaluados. Cada par reúne dos filas de
+# `dim` columnas, así que el número de pares por bloque depende de dim.
+PRESUPUESTO_BYTES = 256 * 2**20
+
+
+def pares_por_bloque(espacio, presupuesto=PRESUPUESTO_BYTES):
+    """Pares por bloque para que las filas reunidas quepan en `presupuesto`."""
+    return max(1, int(presupuesto // (2 * 8 * max(1, espacio.dim))))
+
+
+# ======================================
+#   ESPACIOS DE SIMILITUD
+# ======================================
+
+class EspacioL2:
+    """
+    Series densas (p. ej. AlmacenSeries.valores): similitud 1 / (1 + L2).
+    Las columnas se centran una vez (la L2 no cambia) y las normas se
+    precalculan: bloque() usa distancias_l2_bloque de matriz_blocks y
+    pares() la diferencia directa, acotada por evaluar().
+    """
+
+    def __init__(self, X, precision="float32"):
+        self.precision = precision
+        self.X = centrar(X, precision)
+        self.vectores = self.X
+        self.dim = self.X.shape[1]
+        self.sq = normas_cuadradas(self.X, precision)
+
+    def __len__(self):
+        return len(self.X)
+
+    def pares(self, i, j):
+        diff = self.X[i].astype(np.float64) - self.X[j]
+        return 1.0 / (1.0 + np.sqrt(np.einsum("ij,ij->i", diff, diff)))
+
+    def bloque(self, i0, i1):
+        """Similitud de las filas i0..i1 contra todas (un producto matricial)."""
+        d = distancias_l2_bloque(self.X[i0:i1], self.X, self.sq[i0:i1], self.sq,
+                                 precision=self.precision)
+        return 1.0 / (1.0 + d.astype(np.float64))
+
+
+class EspacioProporcional:
+    """
+    Vectores numéricos (N, f): promedio por columna de similitud_proporcional,
+    igual que construir_matriz_numerica.
+    """
+
+    def __init__(self, X):
+        self.X = np.asarray(X, dtype=np.float64)
+        self.dim = self.X.shape[1]
+        # min/max es monótona en |log|: los árboles usan log1p(|x|) con signo
+        self.vectores = (np.sign(self.X) * np.log1p(np.abs(self.X))).astype(np.float32)
+
+    def __len__(self):
+        return len(self.X)
+
+    def pares(self, i, j):
+        return similitud_proporcional_pares(self.X[i], self.X[j]).mean(axis=1)
+
+
+class EspacioCategorico:
+    """
+    Códigos enteros por campo (N, f) y una tabla de similitud U×U por campo
+    (matriz_unicos): similitud = promedio de tablas[c][cod_i, cod_j].
+    """
+
+    def __init__(self, codigos, tablas, dim_embedding=32, semilla=0):
+        self.codigos = np.asarray(codigos, dtype=np.int64)
+        self.tablas = [np.asarray(t) for t in tablas]
+        self.dim = self.codigos.shape[1]
+        # embedding de cada único: su fila de la tabla, proyectada a dim_embedding
+        rng = np.random.default_rng(semilla)
+        embeddings = []
+        for t in self.tablas:
+            if len(t) > dim_embedding:
+                t = t @ rng.standard_normal((len(t), dim_embedding)) / np.sqrt(dim_embedding)
+            embeddings.append(t)
+        self.vectores = np.hstack([e[self.codigos[:, c]] for c, e in enumerate(embeddings)]).astype(np.float32)
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def pares(self, i, j):
+        total = np.zeros(len(i))
+        for c, t in enumerate(self.tablas):
+            total += t[self.codigos[i, c], self.codigos[j, c]]
+        return total / len(self.tablas)
+
+
+# ======================================
+#   FUSIÓN DE CANDIDATOS
+# ======================================
+
+def fusionar(vecinos, pesos, filas, cols, sims, k, fila0=0):
+    """
+    Agrega candidatos (filas, cols, sims) a las listas (b, k) actuales.
+    `filas` son locales al bloque (la fila r es el municipio fila0 + r).
+    Elimina duplicados y auto-vecinos; conserva los k mejores por fila
+    (similitud descendente, índice ascendente en empates).
+    Devuelve (vecinos, pesos, n_cambios).
+    """
+    n = len(vecinos)
+    validos = vecinos >= 0
+    f_act = np.repeat(np.arange(n), k)[validos.ravel()]
+    todos_f = np.concatenate([f_act, filas])
+    todos_c = np.concatenate([vecinos[validos], cols])
+    todos_s = np.concatenate([pesos[validos], sims])
+
+    fuera = todos_f + fila0 != todos_c
+    todos_f, todos_c, todos_s = todos_f[fuera], todos_c[fuera], todos_s[fuera]
+
+    orden = np.lexsort((todos_c, -todos_s, todos_f))
+    todos_f, todos_c, todos_s = todos_f[orden], todos_c[orden], todos_s[orden]
+
+    # quitar pares repetidos (mismo fila/columna): queda el de mayor similitud
+    clave = todos_f * (int(todos_c.max(initial=0)) + 1) + todos_c
+    _, primeros = np.unique(clave, return_index=True)
+    primeros.sort()
+    todos_f, todos_c, todos_s = todos_f[primeros], todos_c[primeros], todos_s[primeros]
+
+    # posición dentro de cada fila -> las primeras k
+    inicio = np.searchsorted(todos_f, np.arange(n))
+    rango = np.arange(len(todos_f)) - inicio[todos_f]
+    dentro = rango < k
+
+    nuevos_v = np.full((n, k), -1, dtype=np.int64)
+    nuevos_p = np.full((n, k), -np.inf)
+    nuevos_v[todos_f[dentro], rango[dentro]] = todos_c[dentro]
+    nuevos_p[todos_f[dentro], rango[dentro]] = todos_s[dentro]
+
+    cambios = int(np.sum(np.sort(nuevos_v, axis=1) != np.sort(vecinos, axis=1)))
+    return nuevos_v, nuevos_p, cambios
+
+
+def evaluar(espacio, filas, cols, presupuesto=PRESUPUESTO_BYTES):
+    """Similitud de los pares (filas, cols) en bloques acotados por `presupuesto` bytes."""
+    bloque = pares_por_bloque(espacio, presupuesto)
+    sims = np.empty(len(filas))
+    for s in range(0, len(filas), bloque):
+        sims[s:s + bloque] = espacio.pares(filas[s:s + bloque], cols[s:s + bloque])
+    return sims
+
+
+# ======================================
+#   INICIALIZACIÓN: BOSQUE RP
+# ======================================
+
+def hojas_rp(X, tam_hoja, rng):
+    """Hojas de un árbol de proyección aleatoria (lista de arrays de índices)."""
+    hojas = []
+    pila = [np.arange(len(X))]
+    while pila:
+        idx = pila.pop()
+        if len(idx) <= tam_hoja:
+            hojas.append(idx)
+            continue
+        a, b = rng.choice(idx, 2, replace=False)
+        direccion = X[a] - X[b]
+        if not np.any(direccion):
+            direccion = rng.standard_normal(X.shape[1]).astype(X.dtype)
+        proy = X[idx] @ direccion
+        izquierda = proy <= np.median(proy)
+        if izquierda.all() or not izquierda.any():
+            izquierda = rng.random(len(idx)) < 0.5
+        pila.extend([idx[izquierda], idx[~izquierda]])
+    return hojas
+
+
+def candidatos_bosque(X, n_arboles, tam_hoja, rng):
+    """Pares (i, j) que comparten hoja en algún árbol."""
+    filas, cols = [], []
+    for _ in range(n_arboles):
+        for hoja in hojas_rp(X, tam_hoja, rng):
+            i, j = np.meshgrid(hoja, hoja, indexing="ij")
+            filas.append(i.ravel())
+            cols.append(j.ravel())
+    return np.concatenate(filas), np.concatenate(cols)
+
+
+# ======================================
+#   NN-DESCENT
+# ======================================
+
+def vecinos_inversos(vecinos, k, rng):
+    """Hasta k vecinos inversos por nodo (muestra aleatoria), (N, k) con -1 de relleno."""
+    n = len(vecinos)
+    validos = vecinos >= 0
+    origen = np.repeat(np.arange(n), vecinos.shape[1])[validos.ravel()]
+    destino = vecinos[validos]
+
+    orden = np.lexsort((rng.random(len(destino)), destino))
+    origen, destino = origen[orden], destino[orden]
+    inicio = np.searchsorted(destino, np.arange(n))
+    rango = np.arange(len(destino)) - inicio[destino]
+    dentro = rango < k
+
+    inversos = np.full((n, k), -1, dtype=np.int64)
+    inversos[destino[dentro], rango[dentro]] = origen[dentro]
+    return inversos
+
+
+def knn_aproximado(espacio, k=10, n_arboles=8, tam_hoja=None, iteraciones=10,
+                   delta=0.001, bloque_filas=4096, semilla=0, verbose=True):
+    """
+    k-NN aproximado de todos los municipios del espacio.
+    Costo por iteración O(N · (2k)²) evaluaciones de similitud, sin matriz N×N.
+    Devuelve (vecinos (N, k) int64, pesos (N, k) float64).
+    """
+    n = len(espacio)
+    k = min(k, n - 1)
+    rng = np.random.default_rng(semilla)
+    tam_hoja = tam_hoja or max(2 * k, 16)
+
+    vecinos = np.full((n, k), -1, dtype=np.int64)
+    pesos = np.full((n, k), -np.inf)
+
+    # --- inicialización: bosque RP + relleno aleatorio ---
+    if espacio.vectores is not None and n_arboles > 0:
+        filas, cols = candidatos_bosque(espacio.vectores, n_arboles, tam_hoja, rng)
+    else:
+        filas, cols = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    azar_f = np.repeat(np.arange(n), k)
+    azar_c = rng.integers(0, n, n * k)
+    filas, cols = np.concatenate([filas, azar_f]), np.concatenate([cols, azar_c])
+    vecinos, pesos, _ = fusionar(vecinos, pesos, filas, cols, evaluar(espacio, filas, cols), k)
+
+    # --- refinamiento: vecinos de vecinos (directos e inversos) ---
+    for it in range(iteraciones):
+        general = np.hstack([vecinos, vecinos_inversos(vecinos, k, rng)])   # (N, 2k)
+        cambios = 0
+        for r0 in range(0, n, bloque_filas):
+            r1 = min(r0 + bloque_filas, n)
+            g = general[r0:r1]
+            cand = general[np.where(g >= 0, g, 0)].reshape(r1 - r0, -1)     # (b, 4k²)
+            cand[np.repeat(g < 0, general.shape[1], axis=1)] = -1
+            filas = np.repeat(np.arange(r0, r1), cand.shape[1])
+            cols = cand.ravel()
+            ok = cols >= 0
+            filas, cols = filas[ok], cols[ok]
+
+            sub_v, sub_p, c = fusionar(vecinos[r0:r1], pesos[r0:r1], filas - r0, cols,
+                                       evaluar(espacio, filas, cols), k, fila0=r0)
+            vecinos[r0:r1], pesos[r0:r1] = sub_v, sub_p
+            cambios += c
+
+        if verbose:
+            print(f"[NN-descent] iteración {it + 1}: {cambios} cambios")
+        if cambios <= delta * n * k:
+            break
+
+    return vecinos, pesos
+
+
+# ======================================
+#   EXACTO POR BLOQUES Y RECALL
+# ======================================
+
+def knn_exacto(espacio, k=10, presupuesto=PRESUPUESTO_BYTES):
+    """
+    Top-k exacto evaluando el espacio por bloques de filas (sólo para validar).
+    El número de filas por bloque sale de `presupuesto`: con espacio.bloque
+    (producto matricial) cuesta ~ (dim + N) · 8 bytes por fila; con pares,
+    ~ 2 · dim · 8 bytes por par.
+    """
+    n = len(espacio)
+    if hasattr(espacio, "bloque"):
+        bloque_filas = max(1, int(presupuesto // (8 * (espacio.dim + 2 * n))))
+    else:
+        bloque_filas = max(1, pares_por_bloque(espacio, presupuesto) // n)
+
+    vecinos, pesos = [], []
+    for r0 in range(0, n, bloque_filas):
+        r1 = min(r0 + bloque_filas, n)
+        if hasattr(espacio, "bloque"):
+            bloque = espacio.bloque(r0, r1)
+        else:
+            filas = np.repeat(np.arange(r0, r1), n)
+            cols = np.tile(np.arange(n), r1 - r0)
+            bloque = evaluar(espacio, filas, cols, presupuesto).reshape(r1 - r0, n)
+        idx, w = topk_bloque(bloque, k, fila_inicial=r0)
+        vecinos.append(idx)
+        pesos.append(w)
+    return np.vstack(vecinos), np.vstack(pesos)
+
+
+def recall_knn(vecinos_aprox, vecinos_exactos):
+    """Fracción media de los k vecinos exactos que recupera el índice aproximado."""
+    k = vecinos_exactos.shape[1]
+    aciertos = sum(len(np.intersect1d(a, e)) for a, e in zip(vecinos_aprox, vecinos_exactos))
+    return aciertos / (len(vecinos_exactos) * k)
+
+
+def reporte_recall(espacio, k=10, **opciones):
+    """Construye el k-NN aproximado y lo compara con el exacto."""
+    aprox, pesos_aprox = knn_aproximado(espacio, k, **opciones)
+    exacto, pesos_exacto = knn_exacto(espacio, k)
+    return {
+        f"recall_{k}": recall_knn(aprox, exacto),
+        # fracción de la similitud total de los vecinos exactos que se alcanza
+        "similitud_relativa": float(np.sum(pesos_aprox) / np.sum(pesos_exacto)),
+    }
@@ -0,0 +1,59 @@
+# src/utils/escritor_h5.py
+"""
+Escritura de matrices simétricas N×N en HDF5 tile por tile.
+
+El dataset se crea con chunks del mismo tamaño que los tiles de cálculo,
+así cada tile (y su transpuesta) ocupa exactamente un chunk y se escribe
+completo de una sola vez: no hay lectura-modificación-escritura de chunks
+ni escrituras por columna que toquen todos los chunks.
+"""
+
+import numpy as np
+
+COMPRESIONES = ("gzip", "lzf", "none")
+
+
+def opciones_compresion(compresion="gzip", nivel=4):
+    """
+    Traduce el compresor elegido a kwargs de h5py.create_dataset.
+    compresion: 'gzip' (nivel 0–9), 'lzf' o 'none'/None
+    """
+    if compresion is None or compresion == "none":
+        return {}
+    if compresion == "gzip":
+        return {"compression": "gzip", "compression_opts": int(nivel)}
+    if compresion == "lzf":
+        return {"compression": "lzf"}
+    raise ValueError(f"Compresión no soportada: {compresion}. Usa una de {COMPRESIONES}")
+
+
+class EscritorTilesH5:
+    """
+    Dataset N×N con chunks alineados a los tiles del planificador.
+
+    escribir_tile() recibe un tile (i0, i1, j0, j1) del triángulo superior
+    y escribe el bloque y su transpuesta como chunks completos.
+    """
+
+    def __init__(self, h5, nombre, n, tile_size, dtype=np.float32,
+                 compresion="gzip", nivel=4):
+        lado = max(1, min(tile_size, n))
+        self.tile_size = lado
+        self.dset = h5.create_dataset(
+            nombre,
+            shape=(n, n),
+            dtype=dtype,
+            chunks=(lado, lado),
+            **opciones_compresion(compresion, nivel)
+        )
+
+    def escribir_tile(self, tile, bloque):
+        i0, i1, j0, j1 = tile
+        if i0 % self.tile_size or j0 % self.tile_size:
+            raise ValueError(f"Tile {tile} no está alineado a chunks de {self.tile_size}")
+
+        bloque = np.asarray(bloque, dtype=self.dset.dtype)
+        self.dset[i0:i1, j0:j1] = bloque
+        if i0 != j0:
+            # la transpuesta se materializa contigua para escribir el chunk entero
+            self.dset[j0:j1, i0:i1] = np.ascontiguousarray(bloque.T)
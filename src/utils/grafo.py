@@ -1,7 +1,9 @@
+import os
 import h5py
 import pandas as pd
 import numpy as np
 import networkx as nx
+from src.utils.topk import topk_matriz, topk_desde_h5
 
 def cargar_h5(path):
     with h5py.File(path, "r") as f:
@@ -9,39 +11,155 @@ def cargar_h5(path):
         cvegeo = [c.decode("utf-8") for c in f["cvegeo"][:]]
     return pd.DataFrame(matriz, index=cvegeo, columns=cvegeo)
 
-df_sim = cargar_h5("outputs/matriz_sim_general.h5")
 
+def aristas_knn(vecinos, pesos):
+    """
+    Convierte arrays (N, k) de vecinos/pesos en aristas no dirigidas únicas.
+    Si un par aparece dos veces (i→j y j→i) se conserva la primera aparición
+    en orden de filas, igual que el recorrido fila por fila. Los huecos de
+    relleno (vecino -1) no generan arista.
+    Devuelve (origen, destino, peso) como arrays 1-D.
+    """
+    n, k = vecinos.shape
+    destino = np.asarray(vecinos).ravel()
+    validos = destino >= 0
+    origen = np.repeat(np.arange(n), k)[validos]
+    destino = destino[validos]
+    w = np.asarray(pesos).ravel()[validos]
+
+    a = np.minimum(origen, destino)
+    b = np.maximum(origen, destino)
+    _, primeros = np.unique(a * n + b, return_index=True)
+    primeros.sort()
+    return origen[primeros], destino[primeros], w[primeros]
+
+
+def grafo_desde_vecinos(cvegeo, vecinos, pesos):
+    """
+    Construye el grafo networkx en bloque a partir de los arrays top-k.
+    """
+    G = nx.Graph()
+    G.add_nodes_from(cvegeo)
 
+    origen, destino, w = aristas_knn(vecinos, pesos)
+    nodos = np.asarray(cvegeo, dtype=object)
+    G.add_weighted_edges_from(zip(nodos[origen], nodos[destino], w.astype(float)))
+    return G
+
+
+def vecinos_knn(df_sim, k=10, bloque_filas=512):
+    """
+    Top-k vecinos de cada municipio.
+    - df_sim: DataFrame cuadrado de similitud o ruta a un H5 ('matriz', 'cvegeo').
+    Devuelve (cvegeo, vecinos (N, k), pesos (N, k)).
+    """
+    if isinstance(df_sim, str):
+        return topk_desde_h5(df_sim, k, bloque_filas=bloque_filas)
+
+    cvegeo = df_sim.index.tolist()
+    vecinos, pesos = topk_matriz(df_sim.to_numpy(), k, bloque_filas=bloque_filas)
+    return cvegeo, vecinos, pesos
 
 
 def construir_grafo_knn(df_sim, k=10):
     """
     Convierte una matriz de similitud en un grafo k-NN.
-    - df_sim: DataFrame cuadrado de similitud.
+    - df_sim: DataFrame cuadrado de similitud (o ruta a un H5).
     - k: número de vecinos más cercanos.
     
     Las aristas tienen peso = similitud (entre 0 y 1).
     """
+    cvegeo, vecinos, pesos = vecinos_knn(df_sim, k)
+    return grafo_desde_vecinos(cvegeo, vecinos, pesos)
 
-    G = nx.Graph()
-    nodos = df_sim.index.tolist()
 
-    # Agregar nodos
-    for n in nodos:
-        G.add_node(n)
+def construir_grafo_ann(cvegeo, espacio, k=10, **opciones):
+    """
+    Grafo k-NN aproximado directo desde las representaciones (sin matriz N×N).
+    - espacio: EspacioL2 / EspacioProporcional / EspacioCategorico (src.utils.ann)
+    - opciones: parámetros de knn_aproximado (n_arboles, iteraciones, ...)
+    """
+    from src.utils.ann import knn_aproximado
 
-    # Para cada municipio, agregar sus k vecinos con más similitud
-    for i, fila in df_sim.iterrows():
-        
-        # ordena de mayor a menor similitud (excluyendo a sí mismo)
-        vecinos = fila.drop(i).nlargest(k)
+    vecinos, pesos = knn_aproximado(espacio, k, **opciones)
+    return grafo_desde_vecinos(cvegeo, vecinos, pesos)
 
-        for j, sim in vecinos.items():
-            # las aristas son no dirigidas, pero evita duplicarlas
-            if not G.has_edge(i, j):
-                G.add_edge(i, j, weight=float(sim))
 
-    return G
+# ======================================
+#   FORMATO BINARIO COMPACTO (.npy + mmap)
+# ======================================
+# Un directorio con tres arrays:
+#   cvegeo.npy  (N,)    bytes S5
+#   vecinos.npy (N, k)  int32, índices de los vecinos (-1 = hueco de relleno)
+#   pesos.npy   (N, k)  float32, similitud (NaN en los huecos)
+# np.load(..., mmap_mode="r") los abre sin copiarlos.
+
+def guardar_knn(ruta_dir, cvegeo, vecinos, pesos):
+    """Guarda el grafo k-NN como arrays .npy en `ruta_dir`."""
+    os.makedirs(ruta_dir, exist_ok=True)
+    np.save(os.path.join(ruta_dir, "cvegeo.npy"), np.asarray(cvegeo, dtype="S5"))
+    np.save(os.path.join(ruta_dir, "vecinos.npy"), np.asarray(vecinos, dtype=np.int32))
+    np.save(os.path.join(ruta_dir, "pesos.npy"), np.asarray(pesos, dtype=np.float32))
+    print(f"[OK] Grafo k-NN guardado en: {ruta_dir}")
+
+
+def cargar_knn(ruta_dir, mmap=True):
+    """
+    Carga (cvegeo, vecinos, pesos) de `ruta_dir`.
+    Con mmap=True los arrays de vecinos y pesos son vistas de sólo lectura.
+    """
+    modo = "r" if mmap else None
+    cvegeo = [c.decode("utf-8") for c in np.load(os.path.join(ruta_dir, "cvegeo.npy"))]
+    vecinos = np.load(os.path.join(ruta_dir, "vecinos.npy"), mmap_mode=modo)
+    pesos = np.load(os.path.join(ruta_dir, "pesos.npy"), mmap_mode=modo)
+    return cvegeo, vecinos, pesos
+
+
+def knn_a_sparse(vecinos, pesos, simetrica=True):
+    """
+    Matriz de adyacencia scipy.sparse (CSR, N×N) del grafo k-NN.
+    simetrica=True usa las mismas aristas no dirigidas que el grafo networkx.
+    """
+    from scipy import sparse
+
+    n = vecinos.shape[0]
+    if simetrica:
+        origen, destino, w = aristas_knn(vecinos, pesos)
+        filas = np.concatenate([origen, destino])
+        columnas = np.concatenate([destino, origen])
+        datos = np.concatenate([w, w])
+    else:
+        columnas = np.asarray(vecinos).ravel()
+        validos = columnas >= 0
+        filas = np.repeat(np.arange(n), vecinos.shape[1])[validos]
+        columnas = columnas[validos]
+        datos = np.asarray(pesos).ravel()[validos]
+    return sparse.csr_matrix((datos, (filas, columnas)), shape=(n, n))
+
+
+def cargar_grafo_knn(ruta_dir):
+    """Carga el formato binario y construye el grafo networkx bajo demanda."""
+    cvegeo, vecinos, pesos = cargar_knn(ruta_dir)
+    return grafo_desde_vecinos(cvegeo, vecinos, pesos)
+
+
+# ======================================
+#   MATRIZ GENERAL
+# ======================================
+
+# Se lee por bloques de filas dentro de main(); nada se carga al importar.
+RUTA_MATRIZ_GENERAL = "outputs/matriz_sim_general.h5"
+
+
+def main(k=10, graphml=True):
+    cvegeo, vecinos, pesos = vecinos_knn(RUTA_MATRIZ_GENERAL, k=k)
+    guardar_knn("outputs/grafo_knn", cvegeo, vecinos, pesos)
+
+    # GraphML opcional como formato de intercambio
+    if graphml:
+        G = grafo_desde_vecinos(cvegeo, vecinos, pesos)
+        nx.write_graphml(G, "outputs/grafo_knn.graphml")
+
 
-G = construir_grafo_knn(df_sim, k=10)
-nx.write_graphml(G, "outputs/grafo_knn.graphml")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+# src/utils/memoria_compartida.py
+"""
+Publica una matriz numpy una sola vez para que los procesos del pool la
+lean sin copiarla (zero-copy). Dos modos:
+
+- 'shm'    : multiprocessing.shared_memory (RAM compartida)
+- 'memmap' : archivo .npy abierto con mmap (útil si la matriz no cabe en RAM)
+
+Uso típico:
+
+    with MatrizCompartida(M, modo="shm") as mc:
+        with Pool(n, initializer=inicializar_worker, initargs=(mc.descriptor,)) as pool:
+            ...  # las tareas sólo reciben coordenadas; leen con matriz_worker()
+
+inicializar_worker acepta varios descriptores (p. ej. la matriz y sus
+normas); matriz_worker(i) devuelve el i-ésimo.
+"""
+
+import os
+import sys
+import tempfile
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+
+MODOS = ("shm", "memmap")
+
+
+# ======================================
+#   LADO DEL PROCESO PRINCIPAL
+# ======================================
+
+class MatrizCompartida:
+    """
+    Copia M una vez a memoria compartida (o a un .npy) y expone un
+    descriptor ligero (picklable) para que los workers se adjunten.
+    """
+
+    def __init__(self, M, modo="shm", ruta=None):
+        if modo not in MODOS:
+            raise ValueError(f"Modo no soportado: {modo}. Usa uno de {MODOS}")
+
+        M = np.ascontiguousarray(M)
+        self.modo = modo
+        self._shm = None
+        self._ruta = None
+        self._vista = None
+
+        if modo == "shm":
+            self._shm = shared_memory.SharedMemory(create=True, size=max(1, M.nbytes))
+            destino = np.ndarray(M.shape, dtype=M.dtype, buffer=self._shm.buf)
+            destino[...] = M
+            self.descriptor = ("shm", self._shm.name, M.shape, M.dtype.str)
+        else:
+            if ruta is None:
+                fd, ruta = tempfile.mkstemp(suffix=".npy")
+                os.close(fd)
+            np.save(ruta, M)
+            self._ruta = ruta
+            self.descriptor = ("memmap", ruta, M.shape, M.dtype.str)
+
+    def array(self):
+        """
+        Vista de la matriz publicada (sin copia). En modo 'shm' usa el
+        buffer del segmento propio, así el handle vive con el objeto.
+        """
+        if self._vista is None:
+            _, _, shape, dtype = self.descriptor
+            if self._shm is not None:
+                self._vista = np.ndarray(shape, dtype=np.dtype(dtype), buffer=self._shm.buf)
+            else:
+                self._vista = np.load(self._ruta, mmap_mode="r")
+        return self._vista
+
+    def cerrar(self):
+        """
+        Libera la memoria compartida o borra el archivo temporal. Las vistas
+        devueltas por array() dejan de ser válidas.
+        """
+        self._vista = None
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+        if self._ruta is not None:
+            if os.path.exists(self._ruta):
+                os.remove(self._ruta)
+            self._ruta = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+# ======================================
+#   LADO DEL WORKER
+# ======================================
+
+def adjuntar_matriz(descriptor):
+    """
+    Devuelve (array, handle) a partir de un descriptor. El handle debe
+    mantenerse vivo mientras se use el array.
+
+    El segmento pertenece al proceso que lo creó: el worker no lo registra
+    en el resource_tracker (si no, al terminar lo borraría o avisaría de
+    una fuga).
+    """
+    modo, origen, shape, dtype = descriptor
+
+    if modo == "shm":
+        if sys.version_info >= (3, 13):
+            shm = shared_memory.SharedMemory(name=origen, track=False)
+        else:
+            shm = _adjuntar_sin_registro(origen)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        return arr, shm
+
+    if modo == "memmap":
+        arr = np.load(origen, mmap_mode="r")
+        return arr, None
+
+    raise ValueError(f"Descriptor desconocido: {modo}")
+
+
+def _adjuntar_sin_registro(nombre):
+    """
+    SharedMemory(name=...) sin registro en el resource_tracker (Python < 3.13,
+    sin track=False). El tracker lo comparten creador y workers y guarda un
+    conjunto de nombres: un unregister después de adjuntar quitaría también
+    el registro del creador, así que se omite el register.
+    """
+    registrar = resource_tracker.register
+
+    def _registrar(name, rtype):
+        if rtype != "shared_memory":
+            registrar(name, rtype)
+
+    resource_tracker.register = _registrar
+    try:
+        return shared_memory.SharedMemory(name=nombre)
+    finally:
+        resource_tracker.register = registrar
+
+
+_ESTADO = {}
+
+
+def inicializar_worker(*descriptores):
+    """Initializer del Pool: se adjunta una sola vez por proceso."""
+    adjuntos = [adjuntar_matriz(d) for d in descriptores]
+    _ESTADO["matrices"] = [arr for arr, _ in adjuntos]
+    _ESTADO["handles"] = [handle for _, handle in adjuntos]
+
+
+def matriz_worker(indice=0):
+    """Matriz `indice` adjuntada por inicializar_worker en el proceso actual."""
+    if "matrices" not in _ESTADO:
+        raise RuntimeError("El worker no fue inicializado con inicializar_worker().")
+    return _ESTADO["matrices"][indice]
@@ -0,0 +1,69 @@
+# src/utils/planificador.py
+"""
+Planificador de tiles para matrices simétricas N×N.
+
+Sólo se enumeran los tiles (bi, bj) con bi <= bj (triángulo superior);
+cada resultado se refleja en su transpuesta al escribirse. Los tiles se
+reparten entre procesos balanceando su costo (número de pares).
+"""
+
+import heapq
+
+
+# ======================================
+#   ENUMERAR TILES DEL TRIÁNGULO SUPERIOR
+# ======================================
+
+def generar_tiles(n, tile_size):
+    """
+    Devuelve la lista de tiles (i0, i1, j0, j1) con bloque fila <= bloque columna.
+    """
+    cortes = [(i, min(i + tile_size, n)) for i in range(0, n, tile_size)]
+    tiles = []
+    for bi, (i0, i1) in enumerate(cortes):
+        for j0, j1 in cortes[bi:]:
+            tiles.append((i0, i1, j0, j1))
+    return tiles
+
+
+def costo_tile(tile):
+    """Número de pares que calcula un tile."""
+    i0, i1, j0, j1 = tile
+    return (i1 - i0) * (j1 - j0)
+
+
+# ======================================
+#   REPARTO BALANCEADO POR COSTO
+# ======================================
+
+def repartir_tiles(tiles, n_workers):
+    """
+    Reparte los tiles en n_workers grupos de costo similar
+    (heurística LPT: el tile más caro va al grupo menos cargado).
+    """
+    n_workers = max(1, min(n_workers, len(tiles)))
+    grupos = [[] for _ in range(n_workers)]
+    carga = [(0, k) for k in range(n_workers)]
+    heapq.heapify(carga)
+
+    for tile in sorted(tiles, key=costo_tile, reverse=True):
+        total, k = heapq.heappop(carga)
+        grupos[k].append(tile)
+        heapq.heappush(carga, (total + costo_tile(tile), k))
+
+    return grupos
+
+
+# ======================================
+#   REFLEJAR UN TILE EN LA SALIDA
+# ======================================
+
+def reflejar_tile(out, tile, bloque):
+    """
+    Escribe `bloque` en out[i0:i1, j0:j1] y su transpuesta en out[j0:j1, i0:i1].
+    `out` puede ser un array numpy o un dataset h5py.
+    """
+    i0, i1, j0, j1 = tile
+    out[i0:i1, j0:j1] = bloque
+    if i0 != j0:
+        out[j0:j1, i0:i1] = bloque.T
@@ -1,38 +1,184 @@
 # src/utils/tda_cache.py
+"""
+Caché de diagramas de persistencia en HDF5, sin pickle.
+
+Todos los diagramas de un juego de parámetros de embedding se guardan
+concatenados en un solo array float32 con un índice de offsets:
+
+    /<clave>/puntos   (total, 3) float32   [nacimiento, muerte, dimensión]
+    /<clave>/offsets  (n + 1,)   int64     diagrama i = puntos[offsets[i]:offsets[i+1]]
+    /<clave>/cvegeo   (n,)       S5
+    /<clave>/huellas  (n,)       S40       sha1 de la serie de cada municipio
+
+<clave> es un hash de (dim, delay, normalización y, si se usan, las opciones
+de Vietoris-Rips: landmarks, tolerancia, max_edge_length). Al regenerar,
+sólo se recalculan los municipios nuevos o cuya serie cambió.
+"""
+import hashlib
+import json
 import h5py
 import numpy as np
-from joblib import Parallel, delayed
-from src.utils.tda_utils import normalizar_serie, takens_embedding, calcular_diagrama
+from src.utils.tda_utils import normalizar_serie, takens_embedding, calcular_diagramas_lote
+from src.utils.almacen_series import AlmacenSeries
 import os
 
-def generar_y_cachear_diagramas(df_series, columna, salida_h5, dim=3, delay=5, n_jobs=-1):
+NORMALIZACIONES = ("minmax", None)
+
+
+def series_por_municipio(df_series, columna=None):
     """
-    df_series: DataFrame con columnas ['cvegeo', 'fecha', columna]
-    salida_h5: path al archivo h5 donde guardaremos una lista de diagramas (pickled bytes)
+    Diccionario cvegeo -> array de la serie, en orden de cvegeo.
+    Acepta un AlmacenSeries (vistas O(1) del array denso) o un DataFrame
+    largo ['cvegeo', 'fecha', columna], que se agrupa una sola vez.
     """
-    municipios = sorted(df_series["cvegeo"].unique())
-    n = len(municipios)
-    os.makedirs(os.path.dirname(salida_h5), exist_ok=True)
-
-    def proc(cve):
-        x = df_series[df_series.cvegeo == cve][columna].values
-        x_norm = normalizar_serie(x)
-        emb = takens_embedding(x_norm, delay=delay, dimension=dim)
-        dgm = calcular_diagrama(emb)
-        # serializar con numpy np.savez_compressed o pickle
-        return cve, dgm
-
-    results = Parallel(n_jobs=n_jobs)(
-        delayed(proc)(cve) for cve in municipios
-    )
-
-    # Guardar como lista de pickles dentro de h5 (cada diagrama en bytes)
-    import pickle
-    with h5py.File(salida_h5, "w") as f:
-        dt = h5py.special_dtype(vlen=bytes)
-        grp = f.create_group("diagramas")
-        for cve, dgm in results:
-            grp.create_dataset(cve, data=pickle.dumps(dgm), dtype=dt)
-        f.create_dataset("cvegeo", data=np.array(municipios, dtype='S5'))
+    if isinstance(df_series, AlmacenSeries):
+        return {cve: df_series.serie(cve) for cve in sorted(df_series.cvegeo)}
+    return {cve: grupo[columna].to_numpy()
+            for cve, grupo in df_series.groupby("cvegeo", sort=True)}
+
+
+# ======================================================
+# CLAVES Y HUELLAS
+# ======================================================
+def parametros_diagrama(dim=3, delay=5, normalizacion="minmax", n_landmarks=None,
+                        tolerancia=None, max_edge_length=np.inf):
+    """Parámetros que determinan el diagrama; las opciones VR sólo si difieren del default."""
+    parametros = {"dim": dim, "delay": delay, "normalizacion": normalizacion}
+    if n_landmarks is not None:
+        parametros["n_landmarks"] = int(n_landmarks)
+    if tolerancia is not None:
+        parametros["tolerancia"] = float(tolerancia)
+    if not np.isinf(max_edge_length):
+        parametros["max_edge_length"] = float(max_edge_length)
+    return parametros
+
+
+def clave_parametros(dim=3, delay=5, normalizacion="minmax", **opciones_vr):
+    """Hash corto de los parámetros del diagrama (nombre del grupo en el H5)."""
+    parametros = parametros_diagrama(dim, delay, normalizacion, **opciones_vr)
+    texto = json.dumps(parametros, sort_keys=True)
+    return hashlib.sha1(texto.encode()).hexdigest()[:16]
+
+
+def huella_serie(x):
+    """sha1 del contenido de la serie (detecta series que cambiaron)."""
+    return hashlib.sha1(np.ascontiguousarray(x, dtype=np.float64).tobytes()).hexdigest()
+
+
+# ======================================================
+# EMBEDDING
+# ======================================================
+def embedding_de_serie(x, dim=3, delay=5, normalizacion="minmax"):
+    """Serie -> (normalización) -> Takens."""
+    x = np.asarray(x, dtype=np.float64)
+    if normalizacion == "minmax":
+        x = normalizar_serie(x)
+    return takens_embedding(x, delay=delay, dimension=dim)
+
+
+# ======================================================
+# LECTURA / ESCRITURA
+# ======================================================
+def leer_grupo(f, clave):
+    """Diagramas guardados para `clave`: dict cvegeo -> (huella, diagrama)."""
+    if clave not in f:
+        return {}
+    g = f[clave]
+    puntos = g["puntos"][:]
+    offsets = g["offsets"][:]
+    cves = [c.decode() for c in g["cvegeo"][:]]
+    huellas = [h.decode() for h in g["huellas"][:]]
+    return {c: (h, puntos[offsets[i]:offsets[i + 1]])
+            for i, (c, h) in enumerate(zip(cves, huellas))}
+
+
+def escribir_grupo(f, clave, municipios, huellas, diagramas, parametros):
+    if clave in f:
+        del f[clave]
+    g = f.create_group(clave)
+
+    largos = np.array([len(d) for d in diagramas], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(largos)]).astype(np.int64)
+    puntos = (np.concatenate(diagramas).astype(np.float32) if diagramas
+              else np.empty((0, 3), dtype=np.float32))
+
+    g.create_dataset("puntos", data=puntos, compression="gzip")
+    g.create_dataset("offsets", data=offsets)
+    g.create_dataset("cvegeo", data=np.array(municipios, dtype="S5"))
+    g.create_dataset("huellas", data=np.array(huellas, dtype="S40"))
+    g.attrs["parametros"] = json.dumps(parametros, sort_keys=True)
+
+
+def cargar_diagramas(cache_h5, dim=3, delay=5, normalizacion="minmax", **opciones_vr):
+    """
+    Devuelve (cvegeo, puntos, offsets) del grupo de esos parámetros.
+    El diagrama i es puntos[offsets[i]:offsets[i+1]] (vista, sin copia).
+    """
+    clave = clave_parametros(dim, delay, normalizacion, **opciones_vr)
+    with h5py.File(cache_h5, "r") as f:
+        if clave not in f:
+            raise KeyError(f"No hay diagramas para dim={dim}, delay={delay}, "
+                           f"normalizacion={normalizacion} en {cache_h5}")
+        g = f[clave]
+        cves = [c.decode() for c in g["cvegeo"][:]]
+        return cves, g["puntos"][:], g["offsets"][:]
+
+
+def lista_diagramas(puntos, offsets):
+    """Lista de diagramas (vistas) a partir de puntos/offsets."""
+    return [puntos[offsets[i]:offsets[i + 1]] for i in range(len(offsets) - 1)]
+
+
+# ======================================================
+# GENERACIÓN INCREMENTAL
+# ======================================================
+def generar_y_cachear_diagramas(df_series, columna, salida_h5, dim=3, delay=5, n_jobs=-1,
+                                normalizacion="minmax", tamano_lote=64, n_landmarks=None,
+                                tolerancia=None, max_edge_length=np.inf):
+    """
+    df_series: DataFrame con columnas ['cvegeo', 'fecha', columna] o AlmacenSeries
+    salida_h5: path al archivo h5 de la caché (un grupo por juego de parámetros)
+
+    Sólo se calculan los municipios que faltan en la caché o cuya serie cambió.
+    Los embeddings van a Vietoris-Rips en lotes de `tamano_lote` con `n_jobs`
+    procesos; n_landmarks / tolerancia / max_edge_length se pasan a
+    calcular_diagramas_lote (opcionales, acotan el costo de cada complejo).
+    """
+    if normalizacion not in NORMALIZACIONES:
+        raise ValueError(f"Normalización no soportada: {normalizacion}")
+
+    series = series_por_municipio(df_series, columna)
+    municipios = list(series)
+    huellas = {cve: huella_serie(x) for cve, x in series.items()}
+    os.makedirs(os.path.dirname(salida_h5) or ".", exist_ok=True)
+
+    opciones_vr = {"n_landmarks": n_landmarks, "tolerancia": tolerancia,
+                   "max_edge_length": max_edge_length}
+    clave = clave_parametros(dim, delay, normalizacion, **opciones_vr)
+    parametros = parametros_diagrama(dim, delay, normalizacion, **opciones_vr)
+
+    previos = {}
+    if os.path.exists(salida_h5):
+        with h5py.File(salida_h5, "r") as f:
+            previos = leer_grupo(f, clave)
+
+    pendientes = [c for c in municipios
+                  if c not in previos or previos[c][0] != huellas[c]]
+    print(f"Diagramas en caché: {len(municipios) - len(pendientes)}, por calcular: {len(pendientes)}")
+
+    nuevos = {}
+    if pendientes:
+        embs = [embedding_de_serie(series[c], dim, delay, normalizacion) for c in pendientes]
+        dgms, radios = calcular_diagramas_lote(embs, n_jobs=n_jobs, tamano_lote=tamano_lote,
+                                               **opciones_vr)
+        if radios.max() > 0:
+            print(f"Cota bottleneck por submuestreo (2·radio máx): {2 * radios.max():.4g}")
+        nuevos = {c: np.asarray(d, dtype=np.float32) for c, d in zip(pendientes, dgms)}
+
+    diagramas = [nuevos[c] if c in nuevos else previos[c][1] for c in municipios]
+
+    with h5py.File(salida_h5, "a") as f:
+        escribir_grupo(f, clave, municipios, [huellas[c] for c in municipios],
+                       diagramas, parametros)
 
     return salida_h5
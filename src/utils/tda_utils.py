@@ -1,4 +1,5 @@
 import numpy as np
+from functools import lru_cache
 from gtda.homology import VietorisRipsPersistence
 from gtda.diagrams import Scaler, PairwiseDistance
 
@@ -23,15 +24,113 @@ def takens_embedding(X, delay=1, dimension=3):
 # ======================================================
 # PERSISTENCIA (VR COMPLETAMENTE DISPONIBLE)
 # ======================================================
+HOMOLOGIA = (0, 1)
+
 vr = VietorisRipsPersistence(
-    homology_dimensions=[0, 1],
+    homology_dimensions=list(HOMOLOGIA),
     metric="euclidean",
     n_jobs=1
 )
 
+
+@lru_cache(maxsize=None)
+def motor_vr(n_jobs=1, max_edge_length=np.inf, collapse_edges=False):
+    """
+    VietorisRipsPersistence configurado (uno por combinación de parámetros).
+    Con max_edge_length finito las barras que mueren después del corte
+    quedan con muerte = max_edge_length (infinity_values de giotto-tda).
+    """
+    if n_jobs == 1 and np.isinf(max_edge_length) and not collapse_edges:
+        return vr
+    return VietorisRipsPersistence(
+        homology_dimensions=list(HOMOLOGIA),
+        metric="euclidean",
+        max_edge_length=max_edge_length,
+        collapse_edges=collapse_edges,
+        n_jobs=n_jobs
+    )
+
+
 def calcular_diagrama(emb):
     return vr.fit_transform([emb])[0]
 
+
+# ======================================================
+# SUBMUESTREO MAXMIN (LANDMARKS)
+# ======================================================
+def submuestreo_maxmin(emb, n_landmarks=None, tolerancia=None, semilla=0):
+    """
+    Landmarks por muestreo maxmin (farthest point) sobre el embedding.
+
+    Se detiene al llegar a n_landmarks o cuando el radio de cobertura
+    (distancia de Hausdorff entre la nube y los landmarks) es <= tolerancia / 2.
+    Por estabilidad de Rips, la distancia bottleneck entre el diagrama
+    completo y el de los landmarks es <= 2 * radio.
+
+    Devuelve (indices, radio).
+    """
+    n = len(emb)
+    if n_landmarks is None and tolerancia is None:
+        return np.arange(n), 0.0
+    limite = n if n_landmarks is None else min(int(n_landmarks), n)
+    objetivo = 0.0 if tolerancia is None else tolerancia / 2.0
+
+    X = np.asarray(emb, dtype=np.float64)
+    inicial = np.random.default_rng(semilla).integers(n)
+    indices = [inicial]
+    d_min = np.linalg.norm(X - X[inicial], axis=1)
+
+    while len(indices) < limite and d_min.max() > objetivo:
+        nuevo = int(np.argmax(d_min))
+        indices.append(nuevo)
+        np.minimum(d_min, np.linalg.norm(X - X[nuevo], axis=1), out=d_min)
+
+    return np.sort(np.array(indices)), float(d_min.max())
+
+
+# ======================================================
+# DIAGRAMAS POR LOTES
+# ======================================================
+def recortar_relleno(dgm):
+    """
+    Quita los puntos de relleno (nacimiento == muerte) que giotto-tda agrega
+    para igualar tamaños dentro de un lote; deja uno por dimensión vacía.
+    """
+    dgm = np.asarray(dgm)
+    utiles = dgm[:, 1] > dgm[:, 0]
+    faltantes = [q for q in HOMOLOGIA if not np.any(utiles & (dgm[:, 2] == q))]
+    relleno = np.array([[0.0, 0.0, q] for q in faltantes], dtype=dgm.dtype).reshape(-1, 3)
+    return np.concatenate([dgm[utiles], relleno])
+
+
+def calcular_diagramas_lote(embs, n_jobs=1, tamano_lote=64, max_edge_length=np.inf,
+                            n_landmarks=None, tolerancia=None, collapse_edges=False):
+    """
+    Diagramas de persistencia de una lista de embeddings.
+
+    - Los embeddings se mandan a giotto-tda en lotes de `tamano_lote`,
+      con `n_jobs` procesos dentro de cada fit_transform.
+    - n_landmarks / tolerancia: submuestreo maxmin opcional (ver submuestreo_maxmin).
+    - max_edge_length: corte de la filtración (barras más largas quedan truncadas).
+
+    Devuelve (diagramas, radios): lista de arrays (k, 3) sin relleno y el
+    radio de cobertura de cada embedding (0 si no hay submuestreo).
+    """
+    motor = motor_vr(n_jobs, float(max_edge_length), collapse_edges)
+
+    nubes, radios = [], []
+    for emb in embs:
+        idx, radio = submuestreo_maxmin(emb, n_landmarks, tolerancia)
+        nubes.append(np.asarray(emb)[idx])
+        radios.append(radio)
+
+    diagramas = []
+    for i in range(0, len(nubes), tamano_lote):
+        lote = motor.fit_transform(nubes[i:i + tamano_lote])
+        diagramas.extend(recortar_relleno(d) for d in lote)
+
+    return diagramas, np.array(radios)
+
 # ======================================================
 # INTERFAZ COMPATIBLE PARA TDA MATRIZ
 # ======================================================
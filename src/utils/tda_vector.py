@@ -1,12 +1,199 @@
 # src/utils/tda_vector.py
-from gtda.diagrams import PersistenceEntropy, PersistenceImager  # o PersistenceImage en tu versión
-from joblib import Parallel, delayed
+"""
+Vectorización de diagramas de persistencia (persistence images) y matriz
+de distancias aproximada entre municipios.
+
+1. diagramas_a_images: imagen por dimensión de homología en coordenadas
+   (nacimiento, persistencia), gaussianas separables ponderadas por la
+   persistencia -> dos productos matriciales por diagrama.
+2. comprimir: PCA (SVD) o proyección aleatoria a d dimensiones (opcional).
+3. matriz_distancias_vectores: DISTANCIAS L2 (0 = idénticos) por tiles con
+   el motor de matriz_blocks, escritas tile a tile en HDF5 (memoria fija).
+   No es una similitud como las matrices 'matriz' del resto del proyecto:
+   se compara contra la matriz de distancias sliced-Wasserstein, que
+   también es una distancia.
+4. metricas_aproximacion: compara contra la matriz sliced-Wasserstein exacta
+   leyendo ambas por bloques de filas.
+"""
+import os
+import h5py
 import numpy as np
+from joblib import Parallel, delayed
+from src.construccion_matriz.matriz_blocks import (
+    centrar, distancias_l2_bloque, normas_cuadradas
+)
+from src.utils.planificador import generar_tiles
+from src.utils.escritor_h5 import EscritorTilesH5
+from src.utils.topk import topk_bloque
+
+HOMOLOGIA = (0, 1)
+COMPRESIONES_VECTOR = ("pca", "aleatoria", None)
+
+
+# ======================================================
+# PERSISTENCE IMAGES
+# ======================================================
+def rangos_imagen(lista_diagramas, homologia=HOMOLOGIA):
+    """Rango (nacimiento, persistencia) común a todos los diagramas, por dimensión."""
+    rangos = {}
+    for q in homologia:
+        b_min, b_max, p_max = np.inf, -np.inf, 0.0
+        for dgm in lista_diagramas:
+            pts = dgm[dgm[:, 2] == q]
+            if len(pts):
+                b_min = min(b_min, pts[:, 0].min())
+                b_max = max(b_max, pts[:, 0].max())
+                p_max = max(p_max, (pts[:, 1] - pts[:, 0]).max())
+        if not np.isfinite(b_min):
+            b_min, b_max = 0.0, 0.0
+        rangos[q] = ((b_min, max(b_max, b_min + 1e-12)), (0.0, max(p_max, 1e-12)))
+    return rangos
+
+
+def _gaussianas(valores, centros, sigma):
+    """Matriz (k, resolucion) de densidades gaussianas 1D."""
+    z = (valores[:, None] - centros[None, :]) / sigma
+    return np.exp(-0.5 * z * z) / (sigma * np.sqrt(2 * np.pi))
+
+
+def imagen_persistencia(dgm, rangos, resolucion=50, sigma=None):
+    """
+    Persistence image aplanada de un diagrama (una imagen por dimensión,
+    concatenadas). Peso de cada punto = su persistencia, así los puntos de
+    relleno (nacimiento == muerte) no aportan.
+    """
+    imagenes = []
+    for q, ((b0, b1), (p0, p1)) in rangos.items():
+        cb = np.linspace(b0, b1, resolucion)
+        cp = np.linspace(p0, p1, resolucion)
+        s = sigma or 0.1 * max(b1 - b0, p1 - p0)
+        pts = dgm[dgm[:, 2] == q]
+        pers = pts[:, 1] - pts[:, 0]
+        Gb = _gaussianas(pts[:, 0], cb, s) * pers[:, None]
+        Gp = _gaussianas(pers, cp, s)
+        imagenes.append((Gp.T @ Gb).ravel())          # (resolucion, resolucion)
+    return np.concatenate(imagenes).astype(np.float32)
+
 
 def diagramas_a_images(lista_diagramas, n_jobs=-1, image_params=None):
-    # usa PersistenceImager si tu versión la tiene; en giotto-tda hay PersistenceImager o similar
-    pi = PersistenceImager(**(image_params or {}))
-    X = pi.fit_transform(lista_diagramas)  # devuelve shape (n_samples, h, w) or flattened
-    # aplana si hace falta
-    X_flat = X.reshape(X.shape[0], -1)
-    return X_flat
+    """
+    Matriz (N, n_dims · resolucion²) float32 con las persistence images.
+    image_params: {'resolucion': 50, 'sigma': None, 'rangos': None}
+    """
+    params = dict(image_params or {})
+    resolucion = params.get("resolucion", 50)
+    sigma = params.get("sigma")
+    rangos = params.get("rangos") or rangos_imagen(lista_diagramas)
+
+    filas = Parallel(n_jobs=n_jobs, prefer="threads")(
+        delayed(imagen_persistencia)(np.asarray(d), rangos, resolucion, sigma)
+        for d in lista_diagramas
+    )
+    return np.vstack(filas)
+
+
+# ======================================================
+# COMPRESIÓN
+# ======================================================
+def comprimir(X, d=None, metodo="pca", semilla=0):
+    """
+    Reduce X (N, F) a d columnas.
+    metodo: 'pca' (SVD de X centrada), 'aleatoria' (gaussiana / sqrt(d))
+    o None (sin cambios).
+    """
+    if metodo not in COMPRESIONES_VECTOR:
+        raise ValueError(f"Compresión no soportada: {metodo}. Usa una de {COMPRESIONES_VECTOR}")
+    if metodo is None or d is None or d >= X.shape[1]:
+        return X
+
+    X = np.asarray(X, dtype=np.float64)
+    if metodo == "pca":
+        Xc = X - X.mean(axis=0)
+        U, S, _ = np.linalg.svd(Xc, full_matrices=False)
+        return (U[:, :d] * S[:d]).astype(np.float32)
+
+    R = np.random.default_rng(semilla).standard_normal((X.shape[1], d)) / np.sqrt(d)
+    return (X @ R).astype(np.float32)
+
+
+# ======================================================
+# DISTANCIAS POR TILES -> HDF5
+# ======================================================
+def matriz_distancias_vectores(X, salida_h5, cves, tile_size=256, precision="float32",
+                               compresion="gzip", nivel=4):
+    """
+    Distancias L2 entre filas de X escritas en 'distancias' (N×N float32),
+    tile por tile del triángulo superior. Memoria: X + un tile.
+
+    La salida es una distancia (attrs tipo='distancia'), no una similitud:
+    para usarla junto a las matrices de similitud hay que convertirla con
+    distancia_a_similitud (1 / (1 + d)).
+    """
+    n = len(X)
+    X = centrar(X, precision)
+    sq = normas_cuadradas(X, precision)
+
+    os.makedirs(os.path.dirname(salida_h5) or ".", exist_ok=True)
+    with h5py.File(salida_h5, "w") as f:
+        escritor = EscritorTilesH5(f, "distancias", n, tile_size, np.float32, compresion, nivel)
+        f.create_dataset("cvegeo", data=np.array(cves, dtype="S5"))
+        f["distancias"].attrs["tipo"] = "distancia"
+        f["distancias"].attrs["metrica"] = "l2"
+        for tile in generar_tiles(n, tile_size):
+            i0, i1, j0, j1 = tile
+            bloque = distancias_l2_bloque(X[i0:i1], X[j0:j1], sq[i0:i1], sq[j0:j1],
+                                          precision=precision)
+            if i0 == j0:
+                np.fill_diagonal(bloque, 0.0)
+            escritor.escribir_tile(tile, bloque)
+
+    return salida_h5
+
+
+# ======================================================
+# MÉTRICAS CONTRA LA MATRIZ EXACTA
+# ======================================================
+def metricas_aproximacion(h5_aprox, h5_exacto, k=10, bloque_filas=256, dataset="distancias"):
+    """
+    Compara dos matrices de distancias leyendo bloques de filas:
+      - pearson: correlación de las distancias fuera de la diagonal
+      - error_relativo: ||a·D_aprox − D_exacta||_F / ||D_exacta||_F con la
+        escala a de mínimos cuadrados (las escalas de ambas métricas difieren)
+      - recall_k: fracción de los k vecinos más cercanos exactos recuperados
+    """
+    with h5py.File(h5_aprox, "r") as fa, h5py.File(h5_exacto, "r") as fe:
+        A, E = fa[dataset], fe[dataset]
+        n = A.shape[0]
+        s_a = s_e = s_aa = s_ee = s_ae = 0.0
+        aciertos = 0
+        m = 0
+
+        for r0 in range(0, n, bloque_filas):
+            r1 = min(r0 + bloque_filas, n)
+            a = A[r0:r1].astype(np.float64)
+            e = E[r0:r1].astype(np.float64)
+
+            fuera = np.ones(a.shape, dtype=bool)
+            fuera[np.arange(r1 - r0), np.arange(r0, r1)] = False
+            av, ev = a[fuera], e[fuera]
+            s_a += av.sum(); s_e += ev.sum()
+            s_aa += av @ av; s_ee += ev @ ev; s_ae += av @ ev
+            m += av.size
+
+            # vecinos más cercanos = mayor -distancia
+            idx_a, _ = topk_bloque(-a, k, fila_inicial=r0)
+            idx_e, _ = topk_bloque(-e, k, fila_inicial=r0)
+            aciertos += sum(len(np.intersect1d(x[x >= 0], y[y >= 0])) for x, y in zip(idx_a, idx_e))
+
+    cov = s_ae - s_a * s_e / m
+    var_a = s_aa - s_a ** 2 / m
+    var_e = s_ee - s_e ** 2 / m
+    escala = s_ae / s_aa if s_aa > 0 else 0.0
+    residuo = s_ee - 2 * escala * s_ae + escala ** 2 * s_aa
+
+    return {
+        "pearson": float(cov / np.sqrt(var_a * var_e)) if var_a > 0 and var_e > 0 else float("nan"),
+        "error_relativo": float(np.sqrt(max(residuo, 0.0) / s_ee)) if s_ee > 0 else float("nan"),
+        "escala": float(escala),
+        f"recall_{k}": aciertos / (n * min(k, n - 1)),
+    }
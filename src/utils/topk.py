@@ -0,0 +1,204 @@
+# src/utils/topk.py
+"""
+Extracción vectorizada de los k vecinos más similares por fila.
+
+Trabaja por bloques de filas (numpy o dataset h5py) con np.argpartition,
+enmascarando la diagonal, y devuelve arrays compactos (N, k):
+índices de vecinos y pesos (similitud), ordenados de mayor a menor.
+Si una fila tiene menos de k valores válidos (no NaN), los huecos al final
+quedan con índice -1 y peso NaN, como si nlargest hubiera quitado los NaN.
+"""
+
+import h5py
+import numpy as np
+from src.utils.planificador import generar_tiles
+
+
+# ======================================
+#   TOP-K DE UN BLOQUE DE FILAS
+# ======================================
+
+def dtype_pesos(matriz):
+    """dtype de los pesos: el de la matriz si es flotante, si no float32."""
+    dtype = np.dtype(getattr(matriz, "dtype", np.float32))
+    return dtype if np.issubdtype(dtype, np.floating) else np.dtype(np.float32)
+
+
+def seleccionar_topk(valores, indices, k):
+    """
+    Los k mejores de cada fila de `valores` (b, w), con `indices` (b, w)
+    únicos por fila: similitud descendente y, en empate, índice ascendente.
+
+    np.partition da el k-ésimo valor de cada fila; se toman todos los
+    mayores y, de los empatados con él, los de menor índice (igual que
+    nlargest(keep="first")). Sólo las filas con empates en el corte pagan
+    un orden completo. Devuelve (indices (b, k), valores (b, k)) ordenados.
+    """
+    b, w = valores.shape
+    corte = -np.partition(-valores, k - 1, axis=1)[:, k - 1:k]      # (b, 1)
+    mayores = valores > corte
+    empates = valores == corte
+    faltan = k - mayores.sum(axis=1)                                 # >= 1
+
+    elegidos = mayores | empates
+    con_exceso = np.nonzero(empates.sum(axis=1) > faltan)[0]
+    if con_exceso.size:
+        clave = np.where(empates[con_exceso], indices[con_exceso], np.iinfo(np.int64).max)
+        limite = np.take_along_axis(np.sort(clave, axis=1), faltan[con_exceso, None] - 1, axis=1)
+        elegidos[con_exceso] = mayores[con_exceso] | (empates[con_exceso] & (clave <= limite))
+
+    filas, cols = np.nonzero(elegidos)
+    cand = indices[filas, cols].reshape(b, k)
+    vals = valores[filas, cols].reshape(b, k)
+
+    orden = np.lexsort((cand, -vals), axis=1)
+    return np.take_along_axis(cand, orden, axis=1), np.take_along_axis(vals, orden, axis=1)
+
+
+def topk_bloque(bloque, k, fila_inicial=None, excluir=None):
+    """
+    Top-k por fila de un bloque (b, N).
+
+    fila_inicial: si se da, la fila r del bloque corresponde al municipio
+    fila_inicial + r y se excluye a sí mismo (diagonal enmascarada).
+    excluir: alternativa para filas no contiguas; array (b,) con la
+    columna a excluir en cada fila.
+    Los NaN nunca se eligen: si faltan valores válidos, el relleno es
+    índice -1 y peso NaN. En empates gana el índice menor, también en el
+    corte k (como nlargest(keep="first")).
+    Devuelve (indices (b, k) int64, pesos (b, k)) con pesos en el dtype
+    de entrada (float32 si no es flotante).
+    """
+    dtype = dtype_pesos(bloque)
+    bloque = np.array(bloque, dtype=np.float64, copy=True)
+    b, n = bloque.shape
+    bloque[np.isnan(bloque)] = -np.inf
+    if fila_inicial is not None:
+        excluir = fila_inicial + np.arange(b)
+    if excluir is not None:
+        excluir = np.asarray(excluir)
+        bloque[np.arange(b), excluir] = -np.inf
+
+    k = min(k, n - 1 if excluir is not None else n)
+    if k <= 0:
+        return np.empty((b, 0), dtype=np.int64), np.empty((b, 0), dtype=dtype)
+
+    # la columna excluida nunca debe ganar un empate en -inf
+    indices = np.broadcast_to(np.arange(n, dtype=np.int64), (b, n)).copy()
+    if excluir is not None:
+        indices[np.arange(b), excluir] = n + np.arange(b)
+
+    idx, pesos = seleccionar_topk(bloque, indices, k)
+    relleno = ~np.isfinite(pesos)
+    idx[relleno] = -1
+    pesos = pesos.astype(dtype)
+    pesos[relleno] = np.nan
+    return idx.astype(np.int64), pesos
+
+
+# ======================================
+#   TOP-K DE UNA MATRIZ COMPLETA
+# ======================================
+
+def topk_matriz(matriz, k, bloque_filas=512, excluir_diagonal=True):
+    """
+    Top-k de cada fila de una matriz cuadrada (array numpy o dataset h5py),
+    leyendo `bloque_filas` filas a la vez.
+    """
+    n = matriz.shape[0]
+    k_real = min(k, n - 1 if excluir_diagonal else n)
+    indices = np.empty((n, max(k_real, 0)), dtype=np.int64)
+    pesos = np.empty((n, max(k_real, 0)), dtype=dtype_pesos(matriz))
+
+    for r0 in range(0, n, bloque_filas):
+        r1 = min(r0 + bloque_filas, n)
+        idx, w = topk_bloque(matriz[r0:r1], k, r0 if excluir_diagonal else None)
+        indices[r0:r1] = idx
+        pesos[r0:r1] = w
+
+    return indices, pesos
+
+
+def topk_desde_h5(path, k, bloque_filas=512, dataset="matriz"):
+    """
+    Top-k por fila leyendo la matriz de un H5 por bloques.
+    Devuelve (cvegeo, indices, pesos).
+    """
+    with h5py.File(path, "r") as f:
+        cvegeo = [c.decode("utf-8") if isinstance(c, bytes) else str(c) for c in f["cvegeo"][:]]
+        indices, pesos = topk_matriz(f[dataset], k, bloque_filas=bloque_filas)
+    return cvegeo, indices, pesos
+
+
+# ======================================
+#   TOP-K ACUMULADO TILE POR TILE
+# ======================================
+
+class AcumuladorTopK:
+    """
+    Top-k por fila de una matriz N×N que nunca se materializa.
+
+    Cada bloque (filas i0.., columnas j0..) se fusiona con los k mejores
+    acumulados de esas filas (seleccionar_topk sobre k + ancho del bloque).
+    agregar_tile() además fusiona la transpuesta, para los tiles del
+    triángulo superior de matrices simétricas. La diagonal se excluye.
+    Mismo criterio que topk_bloque: similitud descendente y, en empate,
+    índice ascendente; los NaN nunca se eligen (relleno: índice -1, peso NaN).
+    """
+
+    def __init__(self, n, k, dtype=np.float32):
+        self.n = n
+        self.k = max(0, min(k, n - 1))
+        self.dtype = np.dtype(dtype)
+        self.indices = np.full((n, self.k), -1, dtype=np.int64)
+        self.valores = np.full((n, self.k), -np.inf)
+
+    def agregar(self, i0, j0, bloque):
+        if self.k == 0:
+            return
+        bloque = np.array(bloque, dtype=np.float64, copy=True)
+        b, w = bloque.shape
+        bloque[np.isnan(bloque)] = -np.inf
+
+        # diagonal dentro del bloque
+        filas = np.arange(i0, i0 + b)
+        dentro = (filas >= j0) & (filas < j0 + w)
+        bloque[np.nonzero(dentro)[0], filas[dentro] - j0] = -np.inf
+
+        cand = np.hstack([self.indices[i0:i0 + b], np.broadcast_to(np.arange(j0, j0 + w), (b, w))])
+        vals = np.hstack([self.valores[i0:i0 + b], bloque])
+
+        # relleno (-1) y diagonal: claves únicas mayores que cualquier índice
+        # real, para que nunca ganen un empate en -inf
+        posiciones = np.broadcast_to(np.arange(cand.shape[1]), cand.shape)
+        diagonal = cand == filas[:, None]
+        cand = np.where((cand < 0) | diagonal, self.n + posiciones, cand)
+
+        idx, vals = seleccionar_topk(vals, cand, self.k)
+        self.indices[i0:i0 + b] = np.where((idx >= self.n) | ~np.isfinite(vals), -1, idx)
+        self.valores[i0:i0 + b] = vals
+
+    def agregar_tile(self, tile, bloque):
+        """Tile (i0, i1, j0, j1) del triángulo superior de una matriz simétrica."""
+        i0, i1, j0, j1 = tile
+        self.agregar(i0, j0, bloque)
+        if i0 != j0:
+            self.agregar(j0, i0, np.asarray(bloque).T)
+
+    def resultado(self):
+        """(indices (N, k) int64, pesos (N, k)) ordenados de mayor a menor."""
+        pesos = self.valores.astype(self.dtype)
+        pesos[self.indices < 0] = np.nan
+        return self.indices.copy(), pesos
+
+
+def topk_por_tiles(n, k, calcular_bloque, tile_size=512, dtype=np.float32):
+    """
+    Top-k de una matriz simétrica N×N calculando sólo los tiles del
+    triángulo superior: calcular_bloque(i0, i1, j0, j1) -> bloque de similitud.
+    Memoria: O(N·k + tile²).
+    """
+    acumulador = AcumuladorTopK(n, k, dtype)
+    for tile in generar_tiles(n, tile_size):
+        acumulador.agregar_tile(tile, calcular_bloque(*tile))
+    return acumulador.resultado()
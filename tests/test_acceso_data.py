@@ -0,0 +1,20 @@
+import os
+
+import pandas as pd
+
+from data.acceso_data import cargar_tabla
+
+
+def test_cache_truncada_se_reconstruye(tmp_path):
+    fuente = tmp_path / "tabla.csv"
+    pd.DataFrame({"CVEGEO": ["1001", "2002"], "x": [1.0, 2.0]}).to_csv(fuente, index=False)
+    cache_dir = tmp_path / "cache"
+
+    original = cargar_tabla(str(fuente), None, str(cache_dir))
+    (archivo,) = os.listdir(cache_dir)
+    (cache_dir / archivo).write_bytes(b"PAR1truncado")
+
+    pd.testing.assert_frame_equal(cargar_tabla(str(fuente), None, str(cache_dir)), original)
+    # se reescribió una caché válida y no quedan temporales
+    assert os.listdir(cache_dir) == [archivo]
+    pd.testing.assert_frame_equal(pd.read_parquet(cache_dir / archivo), original)
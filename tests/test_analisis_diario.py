@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analisis.analisis_diario import (
+    analizar_series_diarias, analizar_series_diarias_streaming, interpolar_filas,
+    interpolar_por_municipio
+)
+
+
+def serie_larga(horaria, semilla=0):
+    rng = np.random.default_rng(semilla)
+    freq, periodos = ("6h", 40) if horaria else ("D", 12)
+    tiempos = pd.date_range("2021-01-01", periods=periodos, freq=freq)
+    filas = [(f"0{m:04d}", t, rng.normal()) for m in range(7) for t in tiempos]
+    df = pd.DataFrame(filas, columns=["CVEGEO", "valid_time", "temp"])
+    df.loc[rng.random(len(df)) < 0.3, "temp"] = np.nan
+    return df.sample(frac=1, random_state=semilla).reset_index(drop=True)
+
+
+def test_interpolar_filas_igual_a_pandas():
+    rng = np.random.default_rng(1)
+    A = rng.normal(size=(30, 15))
+    A[rng.random(A.shape) < 0.4] = np.nan
+    A[3] = np.nan
+    base = pd.DataFrame(A).interpolate(method="linear", axis=1).to_numpy()
+    np.testing.assert_allclose(interpolar_filas(A), base)
+
+
+def test_interpolar_por_municipio_igual_a_groupby():
+    df = serie_larga(False).sort_values(["CVEGEO", "valid_time"])
+    obtenido = interpolar_por_municipio(df, "CVEGEO", "valid_time", "temp")
+    base = df.groupby("CVEGEO", group_keys=False)["temp"] \
+        .apply(lambda s: s.interpolate(method="linear"))
+    np.testing.assert_allclose(obtenido["temp"].to_numpy(), base.to_numpy())
+
+
+@pytest.mark.parametrize("horaria", [False, True])
+def test_streaming_igual_a_memoria(tmp_path, horaria):
+    entrada = tmp_path / "entrada.parquet"
+    serie_larga(horaria).to_parquet(entrada)
+
+    memoria = analizar_series_diarias(str(entrada), "temp",
+                                      output_path=str(tmp_path / "memoria.parquet"))
+    ruta = analizar_series_diarias_streaming(str(entrada), "temp",
+                                             output_path=str(tmp_path / "streaming.parquet"),
+                                             batch_size=17, municipios_por_lote=3)
+    streaming = pd.read_parquet(ruta)
+
+    columnas = ["CVEGEO", "valid_time", "temp"]
+    memoria = memoria[columnas].sort_values(columnas[:2]).reset_index(drop=True)
+    streaming = streaming[columnas].sort_values(columnas[:2]).reset_index(drop=True)
+    memoria["valid_time"] = pd.to_datetime(memoria["valid_time"]).astype("datetime64[ns]")
+    streaming["valid_time"] = pd.to_datetime(streaming["valid_time"]).astype("datetime64[ns]")
+    pd.testing.assert_frame_equal(streaming, memoria, check_dtype=False, atol=1e-9)
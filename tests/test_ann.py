@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from src.utils.ann import EspacioL2, knn_aproximado, knn_exacto, recall_knn
+
+
+def knn_fuerza_bruta(X, k):
+    """Referencia: similitud 1/(1+L2) de todos los pares, orden estable."""
+    D = np.sqrt(((X[:, None, :] - X[None, :, :]) ** 2).sum(axis=2))
+    S = 1.0 / (1.0 + D)
+    np.fill_diagonal(S, -np.inf)
+    vecinos = np.argsort(-S, axis=1, kind="stable")[:, :k]
+    return vecinos, np.take_along_axis(S, vecinos, axis=1)
+
+
+@pytest.fixture
+def X():
+    rng = np.random.default_rng(0)
+    return 300.0 + 5.0 * rng.normal(size=(60, 8))
+
+
+@pytest.mark.parametrize("presupuesto", [2**20, 8 * 200])
+def test_knn_exacto_igual_a_fuerza_bruta(X, presupuesto):
+    vecinos, pesos = knn_exacto(EspacioL2(X, precision="float64"), k=5, presupuesto=presupuesto)
+    base_v, base_p = knn_fuerza_bruta(X, 5)
+    np.testing.assert_array_equal(vecinos, base_v)
+    np.testing.assert_allclose(pesos, base_p)
+
+
+def test_pares_igual_a_bloque(X):
+    espacio = EspacioL2(X)
+    i, j = np.meshgrid(np.arange(10), np.arange(len(X)), indexing="ij")
+    np.testing.assert_allclose(espacio.pares(i.ravel(), j.ravel()).reshape(10, -1),
+                               espacio.bloque(0, 10), rtol=1e-5)
+
+
+def test_recall_del_exacto_es_uno(X):
+    vecinos, _ = knn_exacto(EspacioL2(X), k=5)
+    assert recall_knn(vecinos, vecinos) == 1.0
+
+
+def test_knn_aproximado_recupera_casi_todo(X):
+    espacio = EspacioL2(X)
+    aprox, _ = knn_aproximado(espacio, k=5, semilla=0, verbose=False)
+    exacto, _ = knn_exacto(espacio, k=5)
+    assert recall_knn(aprox, exacto) >= 0.9
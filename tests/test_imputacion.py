@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analisis.analisis_matriz_completa import (
+    imputar_lote, promedio_vecinos, rellenar_un_municipio
+)
+
+
+@pytest.fixture
+def datos():
+    rng = np.random.default_rng(0)
+    cves = [f"{i:05d}" for i in range(14)]
+    S = rng.uniform(-1, 1, (14, 14))
+    matriz_sim = pd.DataFrame((S + S.T) / 2, index=cves, columns=cves)
+
+    tiempos = pd.date_range("2020-01-01", periods=8, freq="D")
+    filas = [(c, t, rng.normal()) for c in cves[:10] for t in tiempos if rng.random() > 0.2]
+    df = pd.DataFrame(filas, columns=["CVEGEO", "valid_time", "variable"])
+    return df, matriz_sim, cves[10:]
+
+
+def ordenar(df):
+    return df[["CVEGEO", "valid_time", "variable"]].sort_values(["CVEGEO", "valid_time"]) \
+        .reset_index(drop=True)
+
+
+@pytest.mark.parametrize("top_n", [1, 3, 5])
+def test_lote_igual_a_secuencial(datos, top_n):
+    df, matriz_sim, faltantes = datos
+    lote = ordenar(imputar_lote(df, matriz_sim, faltantes, top_n))
+    secuencial = ordenar(pd.concat(
+        [rellenar_un_municipio(c, matriz_sim, df, top_n) for c in faltantes]
+    ))
+    pd.testing.assert_frame_equal(lote, secuencial, check_dtype=False)
+
+
+def test_promedio_ponderado_no_descarta_pesos_no_positivos():
+    W = np.array([[1.0, np.nan], [3.0, 5.0], [7.0, 9.0]])
+    filas = np.array([[0, 1, 2], [1, 2, -1]])
+    pesos = np.array([[-1.0, 0.0, 2.0], [0.0, 0.0, 1.0]])
+
+    X, conteo = promedio_vecinos(W, filas, pesos)
+    # fila 0: sólo el vecino 2 pesa > 0; fila 1: todos pesan 0 -> promedio simple
+    np.testing.assert_allclose(X, [[7.0, 9.0], [5.0, 7.0]])
+    np.testing.assert_array_equal(conteo, [[3, 2], [2, 2]])
+
+    X_lotes, _ = promedio_vecinos(W, filas, pesos, presupuesto=1)
+    np.testing.assert_allclose(X_lotes, X)
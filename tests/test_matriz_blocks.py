@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from src.construccion_matriz import matriz_blocks
+from src.construccion_matriz.matriz_blocks import (
+    construir_matriz_similitud_blocks, distancia_a_similitud, distancia_l2,
+    distancias_l2_bloque
+)
+
+
+def matriz_base(M):
+    """Similitud par a par con las funciones originales."""
+    return np.array([[distancia_a_similitud(distancia_l2(a, b)) for b in M] for a in M],
+                    dtype=np.float32)
+
+
+@pytest.fixture
+def M():
+    rng = np.random.default_rng(0)
+    M = rng.normal(size=(23, 7))
+    M[5] = M[3] + 1e-9          # par casi idéntico: fuerza la corrección por cancelación
+    return M
+
+
+@pytest.mark.parametrize("precision, tol", [("float64", 1e-12), ("float32", 1e-4)])
+def test_distancias_l2_bloque_igual_a_par_a_par(M, precision, tol):
+    D = distancias_l2_bloque(M[:10], M, precision=precision)
+    base = np.array([[distancia_l2(a, b) for b in M] for a in M[:10]])
+    np.testing.assert_allclose(D, base, atol=tol)
+
+
+@pytest.mark.parametrize("block_size", [4, 8, 64])
+def test_tiles_secuencial_igual_a_base(M, block_size):
+    _, out = construir_matriz_similitud_blocks(M, list(range(len(M))), block_size=block_size,
+                                               use_parallel=False)
+    np.testing.assert_allclose(out, matriz_base(M), atol=1e-6)
+
+
+@pytest.mark.parametrize("modo_memoria", ["copia", "shm", "memmap"])
+def test_tiles_en_pool_igual_a_base(M, modo_memoria):
+    _, out = construir_matriz_similitud_blocks(M, list(range(len(M))), block_size=8, n_procs=2,
+                                               modo_memoria=modo_memoria)
+    np.testing.assert_allclose(out, matriz_base(M), atol=1e-6)
+
+
+def test_float32_con_desplazamiento_no_cae_en_correccion(monkeypatch):
+    # series tipo Kelvin: media ~300, σ=5; sin centrar casi todo se recalcula
+    rng = np.random.default_rng(1)
+    M = 300.0 + 5.0 * rng.normal(size=(128, 12))
+    pares = []
+    original = matriz_blocks.recalcular_pares
+
+    def contar(d2, A, B, ii, jj, presupuesto=matriz_blocks.PRESUPUESTO_CORRECCION):
+        pares.append(ii.size)
+        return original(d2, A, B, ii, jj, presupuesto)
+
+    monkeypatch.setattr(matriz_blocks, "recalcular_pares", contar)
+    D = distancias_l2_bloque(M, M, precision="float32")
+
+    base = np.sqrt(((M[:, None, :] - M[None, :, :]) ** 2).sum(axis=2))
+    np.testing.assert_allclose(D, base, rtol=1e-3, atol=1e-2)
+    assert sum(pares) <= len(M)          # sólo la diagonal (d = 0)
+
+
+def test_recalcular_pares_por_lotes_igual_a_directo():
+    rng = np.random.default_rng(2)
+    A, B = rng.normal(size=(9, 5)), rng.normal(size=(7, 5))
+    ii, jj = np.nonzero(np.ones((9, 7), dtype=bool))
+    d2 = np.zeros((9, 7))
+    matriz_blocks.recalcular_pares(d2, A, B, ii, jj, presupuesto=8 * 5 * 3)
+    np.testing.assert_allclose(d2, ((A[:, None] - B[None]) ** 2).sum(axis=2))
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from src.utils.sliced_wasserstein import (
+    proyectar_diagramas, proyectar_rellenas, sw_bloque_exacto, sw_bloque_malla, sw_par,
+    sw_pares, vectores_malla
+)
+
+# [nacimiento, muerte, dimensión]; tamaños distintos por dimensión y diagrama
+DIAGRAMAS = [
+    np.array([[0.0, 0.5, 0], [0.0, 0.2, 0], [0.1, 0.4, 1]]),
+    np.array([[0.0, 0.3, 0], [0.2, 0.6, 1], [0.3, 0.35, 1]]),
+    np.array([[0.0, 0.9, 0], [0.0, 0.1, 0], [0.0, 0.05, 0], [0.5, 0.7, 1]]),
+    np.array([[0.0, 0.4, 0]]),
+]
+
+
+def sw_referencia(d1, d2, n_direcciones=100, orden=2):
+    """
+    Receta de giotto-tda (sliced_wasserstein, n_bins direcciones): por
+    dimensión, L1 entre las proyecciones ordenadas de D1 ∪ diag(D2) y
+    D2 ∪ diag(D1), promediada sobre direcciones; norma `orden` entre dims.
+    """
+    thetas = np.linspace(-np.pi / 2, np.pi / 2, n_direcciones + 1)[:-1]
+    lineas = np.stack([np.cos(thetas), np.sin(thetas)], axis=1)
+    por_dim = []
+    for q in (0, 1):
+        a, b = d1[d1[:, 2] == q, :2], d2[d2[:, 2] == q, :2]
+        diag_a = np.repeat(a.mean(axis=1, keepdims=True), 2, axis=1)
+        diag_b = np.repeat(b.mean(axis=1, keepdims=True), 2, axis=1)
+        A = np.sort(np.vstack([a, diag_b]) @ lineas.T, axis=0)
+        B = np.sort(np.vstack([b, diag_a]) @ lineas.T, axis=0)
+        por_dim.append(np.abs(A - B).sum(axis=0).mean())
+    return np.linalg.norm(por_dim, ord=orden)
+
+
+def matriz_referencia():
+    n = len(DIAGRAMAS)
+    return np.array([[sw_referencia(DIAGRAMAS[i], DIAGRAMAS[j]) for j in range(n)]
+                     for i in range(n)])
+
+
+def test_sw_par_igual_a_referencia():
+    proy = proyectar_diagramas(DIAGRAMAS)
+    obtenido = np.array([[sw_par(a, b) for b in proy] for a in proy])
+    np.testing.assert_allclose(obtenido, matriz_referencia(), atol=1e-12)
+
+
+@pytest.mark.parametrize("tile", [(0, 4, 0, 4), (0, 2, 2, 4), (1, 3, 0, 4)])
+def test_bloque_exacto_igual_a_sw_par(tile):
+    proy = proyectar_diagramas(DIAGRAMAS)
+    i0, i1, j0, j1 = tile
+    base = np.array([[sw_par(proy[i], proy[j]) for j in range(j0, j1)] for i in range(i0, i1)])
+    if i0 == j0:
+        np.fill_diagonal(base, 0.0)
+    bloque = sw_bloque_exacto(proyectar_rellenas(DIAGRAMAS), tile)
+    np.testing.assert_allclose(bloque, base, atol=1e-6)
+
+
+def test_sw_pares_con_presupuesto_minimo():
+    rellenas = proyectar_rellenas(DIAGRAMAS, dtype=np.float64)
+    ii, jj = np.triu_indices(len(DIAGRAMAS), 1)
+    np.testing.assert_allclose(sw_pares(rellenas, ii, jj, presupuesto=1),
+                               matriz_referencia()[ii, jj], atol=1e-12)
+
+
+def test_malla_converge_al_exacto():
+    proy = proyectar_diagramas(DIAGRAMAS)
+    exacta = matriz_referencia()
+    errores = []
+    for n_malla in (10, 100, 1000):
+        vectores = vectores_malla(proy, n_malla, dtype=np.float64)
+        malla = sw_bloque_malla(vectores, (0, 4, 0, 4))
+        errores.append(np.abs(malla - exacta).max())
+    assert errores[0] > errores[1] > errores[2]
+    assert errores[-1] < 1e-2 * exacta.max()
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.topk import topk_bloque, topk_matriz, topk_por_tiles
+
+
+def topk_nlargest(S, k):
+    """Referencia: nlargest(keep='first') por fila, sin la diagonal."""
+    indices = []
+    for i, fila in enumerate(S):
+        s = pd.Series(fila).drop(i)
+        indices.append(s.nlargest(k, keep="first").index.to_numpy())
+    return np.array(indices)
+
+
+def matriz_con_empates(n, semilla):
+    rng = np.random.default_rng(semilla)
+    S = rng.integers(0, 4, size=(n, n)).astype(np.float32)   # muchos empates
+    return np.triu(S, 1) + np.triu(S, 1).T
+
+
+def test_fila_constante_desempata_por_indice():
+    idx, _ = topk_bloque(np.ones((1, 10)), 5, fila_inicial=0)
+    assert idx.tolist() == [[1, 2, 3, 4, 5]]
+
+
+@pytest.mark.parametrize("semilla", range(5))
+@pytest.mark.parametrize("k", [1, 3, 7])
+def test_topk_matriz_igual_a_nlargest(semilla, k):
+    S = matriz_con_empates(17, semilla)
+    idx, pesos = topk_matriz(S, k, bloque_filas=5)
+    np.testing.assert_array_equal(idx, topk_nlargest(S, k))
+    np.testing.assert_array_equal(pesos, np.take_along_axis(S, idx, axis=1))
+
+
+@pytest.mark.parametrize("semilla", range(5))
+@pytest.mark.parametrize("tile_size", [3, 6, 32])
+def test_topk_por_tiles_igual_a_nlargest(semilla, tile_size):
+    S = matriz_con_empates(17, semilla)
+    idx, _ = topk_por_tiles(len(S), 4, lambda i0, i1, j0, j1: S[i0:i1, j0:j1],
+                            tile_size=tile_size)
+    np.testing.assert_array_equal(idx, topk_nlargest(S, 4))
+
+
+def topk_nlargest_con_relleno(S, k):
+    """nlargest sin NaN (como el código original) rellenado con -1 / NaN."""
+    indices = np.full((len(S), k), -1)
+    pesos = np.full((len(S), k), np.nan)
+    for i, fila in enumerate(S):
+        s = pd.Series(fila).drop(i).dropna().nlargest(k, keep="first")
+        indices[i, :len(s)] = s.index
+        pesos[i, :len(s)] = s.to_numpy()
+    return indices, pesos
+
+
+def matriz_con_nan(n, semilla):
+    S = matriz_con_empates(n, semilla)
+    rng = np.random.default_rng(semilla)
+    mascara = np.triu(rng.random((n, n)) < 0.5, 1)
+    S[mascara | mascara.T] = np.nan
+    S[0, 1:] = S[1:, 0] = np.nan                       # fila sin ningún válido
+    return S
+
+
+def test_nan_no_se_eligen_como_vecinos():
+    idx, pesos = topk_bloque(np.array([[np.nan, np.nan, 1.0, np.nan]]), 3)
+    assert idx.tolist() == [[2, -1, -1]]
+    np.testing.assert_array_equal(pesos, [[1.0, np.nan, np.nan]])
+
+
+@pytest.mark.parametrize("semilla", range(5))
+def test_topk_matriz_con_nan_igual_a_nlargest(semilla):
+    S = matriz_con_nan(15, semilla)
+    idx, pesos = topk_matriz(S, 6, bloque_filas=4)
+    base_idx, base_pesos = topk_nlargest_con_relleno(S, 6)
+    np.testing.assert_array_equal(idx, base_idx)
+    np.testing.assert_array_equal(pesos, base_pesos.astype(np.float32))
+
+
+def test_aristas_knn_omite_relleno():
+    from src.utils.grafo import aristas_knn
+
+    vecinos = np.array([[1, -1], [0, 2], [-1, -1]])
+    pesos = np.array([[0.5, np.nan], [0.5, 0.3], [np.nan, np.nan]])
+    origen, destino, w = aristas_knn(vecinos, pesos)
+    assert list(zip(origen, destino)) == [(0, 1), (1, 2)]
+    np.testing.assert_array_equal(w, [0.5, 0.3])
+
+
+@pytest.mark.parametrize("semilla", range(5))
+@pytest.mark.parametrize("tile_size", [4, 32])
+def test_topk_por_tiles_con_nan_igual_a_nlargest(semilla, tile_size):
+    S = matriz_con_nan(15, semilla)
+    idx, pesos = topk_por_tiles(len(S), 6, lambda i0, i1, j0, j1: S[i0:i1, j0:j1],
+                                tile_size=tile_size)
+    base_idx, base_pesos = topk_nlargest_con_relleno(S, 6)
+    np.testing.assert_array_equal(idx, base_idx)
+    np.testing.assert_array_equal(pesos, base_pesos.astype(np.float32))